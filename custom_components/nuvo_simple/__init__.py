@@ -1,13 +1,15 @@
 """The Nuvo Classic component."""
+import asyncio
 import logging
 
 import voluptuous as vol
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, SupportsResponse, callback
 from homeassistant.config_entries import ConfigEntry, SOURCE_IMPORT
 from homeassistant.const import CONF_NAME, CONF_PORT, Platform
-from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.exceptions import ConfigEntryNotReady, ServiceValidationError
 from homeassistant.helpers import config_validation as cv, discovery, entity_registry as er
+from homeassistant.helpers.storage import Store
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,6 +28,9 @@ CONF_SOURCES = "sources"
 CONF_MIN_OFFSET = "min_offset"
 CONF_MAX_OFFSET = "max_offset"
 CONF_ALL_OFF_RECALL = "all_off_recall"
+CONF_OPTIMISTIC = "optimistic"
+CONF_STATISTICS = "statistics"
+CONF_METRICS = "metrics"
 MODEL = "model"
 
 DEFAULT_BAUD = "9600"
@@ -40,10 +45,24 @@ SERVICE_PAGE_OFF = "paging_off"
 SERVICE_MUTE = "mute_all"
 SERVICE_UNMUTE = "unmute_all"
 SERVICE_ALL_OFF = "all_off"
+SERVICE_RAMP_VOLUME = "ramp_volume"
+SERVICE_SNAPSHOT = "snapshot"
+SERVICE_RESTORE = "restore"
+SERVICE_APPLY_STATE = "apply_state"
 
 PAGE_ZONES = "page_zones"
 ZONE_PAGE_VOLUME = "zone_page_volume"
 
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_SNAPSHOT_NAME = "name"
+
+DEFAULT_SNAPSHOT_NAME = "default"
+
+ATTR_ZONES = "zones"
+ATTR_VOLUME_LEVEL = "volume_level"
+
+DATA_METRICS_VIEW = "nuvo_simple_metrics_view"
+
 ZONE_SCHEMA = vol.Schema({
     vol.Required(CONF_NAME): cv.string,
     vol.Optional(CONF_ZONE_PAGE_VOLUME): cv.string,
@@ -56,6 +75,33 @@ SOURCE_SCHEMA = vol.Schema({
 ZONE_IDS = vol.All(vol.Coerce(int), vol.Range(min=1, max=12))
 SOURCE_IDS = vol.All(vol.Coerce(int), vol.Range(min=1, max=6))
 
+
+def _tone_step(value):
+    """Bass and treble go in 2 dB steps, as on the number entities."""
+    if value % 2:
+        raise vol.Invalid("must be a multiple of 2")
+    return int(value)
+
+
+TONE_LEVELS = vol.All(vol.Coerce(float), vol.Range(min=-12, max=12), _tone_step)
+
+# Ranges and steps as on the number entities, the offset range is checked per amp
+ZONE_STATE_SCHEMA = vol.Schema({
+    vol.Optional('power'): cv.boolean,
+    vol.Optional('source'): vol.Any(SOURCE_IDS, cv.string),
+    vol.Optional(ATTR_VOLUME_LEVEL): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+    vol.Optional('mute'): cv.boolean,
+    vol.Optional('bass'): TONE_LEVELS,
+    vol.Optional('treble'): TONE_LEVELS,
+    vol.Optional('balance'): vol.All(vol.Coerce(int), vol.Range(min=-6, max=6)),
+    vol.Optional('volume_offset'): vol.Coerce(int),
+})
+
+APPLY_STATE_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Required(ATTR_ZONES): vol.Schema({cv.entity_id: ZONE_STATE_SCHEMA}),
+})
+
 CONFIG_SCHEMA = vol.Schema(
     {
         DOMAIN: vol.Schema(
@@ -75,8 +121,191 @@ CONFIG_SCHEMA = vol.Schema(
     extra=vol.ALLOW_EXTRA,
 )
 
-from serial import SerialException
-from nuvo_simple import get_nuvo
+from .connection import NuvoConnection
+from .coordinator import STORAGE_VERSION, NuvoCoordinator
+from .protocol import MODEL_CONCERTO, MODEL_UNKNOWN, level_to_db
+from .metrics import NuvoMetricsView
+from .stats import NuvoStats
+
+
+def _latency_ms(latencies):
+    """Paging latency of the slowest amp, None if nothing was sent."""
+    latencies = [latency for latency in latencies if latency is not None]
+    return round(max(latencies) * 1000) if latencies else None
+
+
+def _zone_state(data, zone_id, entity_id, state):
+    """Validate the state wanted for a zone against its amp.
+
+    Returns it in the units of the coordinator snapshot.
+    """
+    values = dict(state)
+    if zone_id == 0 and set(values) - {'power', 'source', ATTR_VOLUME_LEVEL, 'mute'}:
+        raise ServiceValidationError(f"{entity_id} only has power, source, volume and mute")
+    if 'source' in values:
+        source = values['source']
+        if source not in data[CONF_SOURCES]:
+            source = {name: source_id for source_id, name in data[CONF_SOURCES].items()}.get(source)
+        if source is None:
+            raise ServiceValidationError(f"Unknown source {values['source']} for {entity_id}")
+        values['source'] = source
+    if ATTR_VOLUME_LEVEL in values:
+        values['volume'] = level_to_db(values.pop(ATTR_VOLUME_LEVEL))
+    if 'balance' in values and data[MODEL] != MODEL_CONCERTO:
+        raise ServiceValidationError(f"{data[MODEL]} has no balance control, {entity_id}")
+    if ('volume_offset' in values
+            and not data[CONF_MIN_OFFSET] <= values['volume_offset'] <= data[CONF_MAX_OFFSET]):
+        raise ServiceValidationError(
+            f"Volume offset of {entity_id} must be between "
+            f"{data[CONF_MIN_OFFSET]} and {data[CONF_MAX_OFFSET]}")
+    return values
+
+
+def legacy_entry_data(hass: HomeAssistant):
+    """Data of the first amp, used by the legacy platform setup."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    return hass.data[DOMAIN][entry.entry_id]
+
+
+def _migrate_unique_id(entry: ConfigEntry, entity_entry):
+    """Scope unique ids from before multiple amps were supported to the entry."""
+    if entity_entry.unique_id.startswith('nuvo_simple_zone_'):
+        return {'new_unique_id': entity_entry.unique_id.replace(
+            'nuvo_simple_', f'nuvo_simple_{entry.entry_id}_', 1)}
+    return None
+
+
+def _zone_unique_ids(prefix, zone_id):
+    return [
+        f'{prefix}_zone_{zone_id}',
+        f'{prefix}_zone_{zone_id}_bass',
+        f'{prefix}_zone_{zone_id}_treble',
+        f'{prefix}_zone_{zone_id}_volume_offset',
+        f'{prefix}_zone_{zone_id}_balance',
+        f'{prefix}_zone_{zone_id}_source_group',
+        f'{prefix}_zone_{zone_id}_volume_reset',
+        f'{prefix}_zone_{zone_id}_keypad_lock',
+        f'{prefix}_zone_{zone_id}_override',
+    ]
+
+
+def _parse_options(conf):
+    """Zones, sources, paging and offsets from the entry data and options."""
+    zones = {int(k): v for k, v in conf[CONF_ZONES].items()}
+    sources = {int(k): v[CONF_NAME] for k, v in conf[CONF_SOURCES].items()}
+
+    page_source = int(conf.get(CONF_PAGE_SOURCE, DEFAULT_PAGE_SOURCE))
+    page_volume_default = int(conf.get(CONF_PAGE_VOLUME, DEFAULT_PAGE_VOLUME))
+
+    page_zones = []
+    zone_page_volumes = []
+    for zone_id, extra in zones.items():
+        page_zones.append(zone_id)
+        pv = extra.get(CONF_ZONE_PAGE_VOLUME)
+        vol_val = int(pv) if pv else page_volume_default
+        zone_page_volumes.append(vol_val)
+        _LOGGER.info("Page zone %d with volume %d%%", zone_id, vol_val)
+
+    return {
+        CONF_PAGE_SOURCE: page_source,
+        CONF_PAGE_VOLUME: page_volume_default,
+        CONF_MIN_OFFSET: int(conf.get(CONF_MIN_OFFSET, DEFAULT_MIN_OFFSET)),
+        CONF_MAX_OFFSET: int(conf.get(CONF_MAX_OFFSET, DEFAULT_MAX_OFFSET)),
+        CONF_SOURCES: sources,
+        CONF_ZONES: zones,
+        PAGE_ZONES: page_zones,
+        ZONE_PAGE_VOLUME: zone_page_volumes,
+    }
+
+
+def _setup_statistics(hass: HomeAssistant, nuvo: NuvoConnection, conf):
+    """Collect link statistics while diagnostics or metrics want them."""
+    metrics = conf.get(CONF_METRICS, False)
+    if not (conf.get(CONF_STATISTICS, False) or metrics):
+        nuvo.stats = None
+        return
+    if nuvo.stats is None:
+        nuvo.stats = NuvoStats()
+    # Views can not be removed again, it answers 404 while no amp has metrics on
+    if metrics and not hass.data.get(DATA_METRICS_VIEW):
+        hass.http.register_view(NuvoMetricsView(hass))
+        hass.data[DATA_METRICS_VIEW] = True
+
+
+@callback
+def async_add_zone_entities(hass: HomeAssistant, entry: ConfigEntry, async_add_entities,
+                            zone_entities):
+    """Add the entities of every zone and keep the factory for zones added later.
+
+    zone_entities(zone_id, zone_name) returns the entities of one zone on
+    the calling platform.
+    """
+    data = hass.data[DOMAIN][entry.entry_id]
+
+    @callback
+    def add_zones(zone_ids):
+        new_entities = []
+        for zone_id in zone_ids:
+            entities = zone_entities(zone_id, data[CONF_ZONES][zone_id][CONF_NAME])
+            data['entities'].setdefault(zone_id, []).extend(entities)
+            new_entities.extend(entities)
+        async_add_entities(new_entities)
+
+    data['zone_adders'].append(add_zones)
+    add_zones(list(data[CONF_ZONES]))
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply changed options without reconnecting, unless the port changed."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    old = data['conf']
+    conf = {**entry.data, **entry.options}
+    if (old[CONF_PORT] != conf[CONF_PORT]
+            or old.get(CONF_BAUD, DEFAULT_BAUD) != conf.get(CONF_BAUD, DEFAULT_BAUD)):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    coordinator = data['coordinator']
+    options = _parse_options(conf)
+    old_zones = data[CONF_ZONES]
+    zones = options[CONF_ZONES]
+    data.update(options)
+    data['conf'] = conf
+
+    coordinator.all_off_recall = conf.get(CONF_ALL_OFF_RECALL, False)
+    coordinator.optimistic = conf.get(CONF_OPTIMISTIC, False)
+    _setup_statistics(hass, data['nuvo'], conf)
+    coordinator.setup_paging(options[CONF_PAGE_SOURCE], options[PAGE_ZONES],
+                             options[ZONE_PAGE_VOLUME])
+
+    removed = [zone_id for zone_id in old_zones if zone_id not in zones]
+    added = [zone_id for zone_id in zones if zone_id not in old_zones]
+
+    entity_registry = er.async_get(hass)
+    for zone_id in removed:
+        _LOGGER.info("Removing zone %d", zone_id)
+        for entity in data['entities'].pop(zone_id, []):
+            if entity_registry.async_get(entity.entity_id):
+                entity_registry.async_remove(entity.entity_id)
+            else:
+                await entity.async_remove()
+        coordinator.async_remove_zone(zone_id)
+
+    for zone_id in added:
+        _LOGGER.info("Adding zone %d - %s", zone_id, zones[zone_id][CONF_NAME])
+        coordinator.async_add_zone(zone_id)
+    if added:
+        for add_zones in data['zone_adders']:
+            add_zones(added)
+        for zone_id in added:
+            coordinator.async_request_refresh(zone_id)
+
+    # Names, sources and offset ranges of the zones that stayed
+    for zone_id, entities in data['entities'].items():
+        if zone_id in added:
+            continue
+        for entity in entities:
+            entity.async_update_options(data)
 
 
 async def async_setup(hass: HomeAssistant, config: dict) -> bool:
@@ -108,122 +337,211 @@ async def async_setup(hass: HomeAssistant, config: dict) -> bool:
     return True
 
 
+async def _async_check_model(hass: HomeAssistant, entry: ConfigEntry, nuvo: NuvoConnection):
+    """Ask the amp for its model and reload the entry if it changed.
+
+    Returns False if a reload was scheduled.
+    """
+    stored = entry.data.get(MODEL)
+    model = await nuvo.async_get_model()
+    if model == MODEL_UNKNOWN:
+        _LOGGER.warning("Nuvo did not report its model, keeping %s", stored)
+        return True
+    if model == stored:
+        _LOGGER.debug("Nuvo model %s confirmed", model)
+        return True
+    _LOGGER.warning("Nuvo reports model %s instead of %s, reloading", model, stored)
+    hass.config_entries.async_update_entry(entry, data={**entry.data, MODEL: model})
+    hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
+    return False
+
+
+async def _async_start(hass: HomeAssistant, entry: ConfigEntry, nuvo: NuvoConnection,
+                       coordinator: NuvoCoordinator, verify):
+    """Read every zone once the link is up, after checking the stored model."""
+    await nuvo.async_wait_connected()
+    if verify and not await _async_check_model(hass, entry, nuvo):
+        return
+    await coordinator.async_prefetch()
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Nuvo Classic from a config entry."""
     conf = {**entry.data, **entry.options}
     port = conf[CONF_PORT]
     baud = conf.get(CONF_BAUD, DEFAULT_BAUD)
     all_off_recall = conf.get(CONF_ALL_OFF_RECALL, False)
-
-    try:
-        nuvo = await hass.async_add_executor_job(get_nuvo, port, baud, all_off_recall)
-    except SerialException:
-        raise ConfigEntryNotReady(f"Cannot connect to serial port {port}")
-
-    model = await hass.async_add_executor_job(nuvo.get_model)
-    if model == 'Unknown':
-        raise ConfigEntryNotReady("Cannot detect Nuvo model")
-
-    _LOGGER.info('Detected Nuvo model %s', model)
-
-    zones = {int(k): v for k, v in conf[CONF_ZONES].items()}
-    sources = {int(k): v[CONF_NAME] for k, v in conf[CONF_SOURCES].items()}
-
-    page_source = int(conf.get(CONF_PAGE_SOURCE, DEFAULT_PAGE_SOURCE))
-    page_volume_default = int(conf.get(CONF_PAGE_VOLUME, DEFAULT_PAGE_VOLUME))
-
-    page_zones = []
-    zone_page_volumes = []
-    for zone_id, extra in zones.items():
-        page_zones.append(zone_id)
-        pv = extra.get(CONF_ZONE_PAGE_VOLUME)
-        vol_val = int(pv) if pv else page_volume_default
-        zone_page_volumes.append(vol_val)
-        _LOGGER.info("Page zone %d with volume %d%%", zone_id, vol_val)
-
-    hass.data[DOMAIN] = {
+    optimistic = conf.get(CONF_OPTIMISTIC, False)
+
+    nuvo = NuvoConnection(port, baud)
+    _setup_statistics(hass, nuvo, conf)
+
+    # The model was detected when the entry was created, so there is no
+    # need to wait for the link, it is checked once the amp answers
+    model = entry.data.get(MODEL)
+    verify = bool(model) and model != MODEL_UNKNOWN
+    if verify:
+        nuvo.model = model
+        await nuvo.async_open(lazy=True)
+        _LOGGER.info('Using stored Nuvo model %s', model)
+    else:
+        try:
+            await nuvo.async_open()
+        except OSError:
+            raise ConfigEntryNotReady(f"Cannot connect to serial port {port}")
+
+        model = await nuvo.async_get_model()
+        if model == MODEL_UNKNOWN:
+            await nuvo.async_close()
+            raise ConfigEntryNotReady("Cannot detect Nuvo model")
+
+        _LOGGER.info('Detected Nuvo model %s', model)
+        hass.config_entries.async_update_entry(entry, data={**entry.data, MODEL: model})
+        conf[MODEL] = model
+
+    options = _parse_options(conf)
+    zones = options[CONF_ZONES]
+
+    coordinator = NuvoCoordinator(hass, entry.entry_id, nuvo, model, list(zones.keys()),
+                                  all_off_recall, optimistic)
+    coordinator.setup_paging(options[CONF_PAGE_SOURCE], options[PAGE_ZONES],
+                             options[ZONE_PAGE_VOLUME])
+    if await coordinator.async_load() or verify:
+        # Entities start from the saved state while the amp is read
+        entry.async_create_background_task(
+            hass, _async_start(hass, entry, nuvo, coordinator, verify),
+            f'{DOMAIN} start {entry.entry_id}')
+    else:
+        await coordinator.async_prefetch()
+
+    @callback
+    def _async_mismatch():
+        entry.async_create_background_task(
+            hass, _async_check_model(hass, entry, nuvo), f'{DOMAIN} check model {entry.entry_id}')
+
+    nuvo.mismatch_callback = _async_mismatch
+
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
         'nuvo': nuvo,
-        CONF_PAGE_SOURCE: page_source,
-        CONF_PAGE_VOLUME: page_volume_default,
-        CONF_MIN_OFFSET: int(conf.get(CONF_MIN_OFFSET, DEFAULT_MIN_OFFSET)),
-        CONF_MAX_OFFSET: int(conf.get(CONF_MAX_OFFSET, DEFAULT_MAX_OFFSET)),
-        CONF_SOURCES: sources,
-        CONF_ZONES: zones,
+        'coordinator': coordinator,
+        'conf': conf,
+        # Zone id -> entities of that zone, on every platform
+        'entities': {},
+        # Callables adding the entities of new zones, one per platform
+        'zone_adders': [],
         MODEL: model,
-        PAGE_ZONES: page_zones,
-        ZONE_PAGE_VOLUME: zone_page_volumes,
+        **options,
     }
 
-    def service_handle(service):
-        """Handle for services."""
+    async def service_handle(service):
+        """Handle for services.
+
+        Services act on the amp given by config_entry_id, or on every amp
+        at once if it is left out.
+        """
         _LOGGER.debug("Nuvo service handler called.")
-        _nuvo = hass.data[DOMAIN]['nuvo']
-        _page_source = hass.data[DOMAIN][CONF_PAGE_SOURCE]
-        _page_zones = hass.data[DOMAIN][PAGE_ZONES]
-        _page_volume = hass.data[DOMAIN][ZONE_PAGE_VOLUME]
+        entry_id = service.data.get(ATTR_CONFIG_ENTRY_ID)
+        _coordinators = [
+            data['coordinator'] for _entry_id, data in hass.data[DOMAIN].items()
+            if entry_id in (None, _entry_id)
+        ]
+        if entry_id is not None and not _coordinators:
+            _LOGGER.error("Nuvo service called for unknown config entry %s", entry_id)
+            return None
 
         if service.service == SERVICE_PAGE_OFF:
             _LOGGER.info("Paging off service called.")
-            _nuvo.page_off(_page_source, _page_zones)
-            return
+            latencies = await asyncio.gather(
+                *[_coordinator.async_page_off() for _coordinator in _coordinators])
+            return {'latency_ms': _latency_ms(latencies)}
 
         if service.service == SERVICE_PAGE_ON:
             _LOGGER.info("Paging on service called.")
             volume_offset = int(service.data.get('volume_offset', 0))
-            adjusted_volume = [min(100, max(0, int(v) + volume_offset)) for v in _page_volume]
-            _nuvo.page_on(_page_source, _page_zones, adjusted_volume)
+            latencies = await asyncio.gather(
+                *[_coordinator.async_page_on(volume_offset) for _coordinator in _coordinators])
+            return {'latency_ms': _latency_ms(latencies)}
+
+        if service.service == SERVICE_SNAPSHOT:
+            _LOGGER.info("Snapshot service called.")
+            name = str(service.data.get(ATTR_SNAPSHOT_NAME, DEFAULT_SNAPSHOT_NAME))
+            for _coordinator in _coordinators:
+                _coordinator.async_snapshot(name)
             return
 
+        if service.service == SERVICE_RESTORE:
+            _LOGGER.info("Restore service called.")
+            name = str(service.data.get(ATTR_SNAPSHOT_NAME, DEFAULT_SNAPSHOT_NAME))
+            latencies = await asyncio.gather(
+                *[_coordinator.async_restore(name) for _coordinator in _coordinators])
+            return {'latency_ms': _latency_ms(latencies)}
+
+        if service.service == SERVICE_APPLY_STATE:
+            _LOGGER.info("Apply state service called.")
+            # Validate every zone before anything is sent
+            states = {}
+            for entity_id, state in service.data[ATTR_ZONES].items():
+                for _entry_id, data in hass.data[DOMAIN].items():
+                    zone_id = data['coordinator'].media_player_zone(entity_id)
+                    if zone_id is not None and entry_id in (None, _entry_id):
+                        break
+                else:
+                    raise ServiceValidationError(f"{entity_id} is not a Nuvo zone")
+                states.setdefault(data['coordinator'], {})[zone_id] = _zone_state(
+                    data, zone_id, entity_id, state)
+            latencies = await asyncio.gather(
+                *[_coordinator.async_apply_state(zone_states)
+                  for _coordinator, zone_states in states.items()])
+            return {'latency_ms': _latency_ms(latencies)}
+
         if service.service == SERVICE_MUTE:
             _LOGGER.info("Mute All service called.")
-            _nuvo.mute_all()
+            await asyncio.gather(*[_coordinator.async_mute_all() for _coordinator in _coordinators])
             return
 
         if service.service == SERVICE_UNMUTE:
             _LOGGER.info("Unmute All service called.")
-            _nuvo.unmute_all()
+            await asyncio.gather(*[_coordinator.async_unmute_all() for _coordinator in _coordinators])
             return
 
         if service.service == SERVICE_ALL_OFF:
             _LOGGER.info("All Off service called.")
-            _nuvo.all_off()
+            await asyncio.gather(*[_coordinator.async_all_off() for _coordinator in _coordinators])
             return
 
     if not hass.services.has_service(DOMAIN, SERVICE_PAGE_ON):
-        hass.services.async_register(DOMAIN, SERVICE_PAGE_ON, service_handle, schema=None)
-        hass.services.async_register(DOMAIN, SERVICE_PAGE_OFF, service_handle, schema=None)
+        hass.services.async_register(DOMAIN, SERVICE_PAGE_ON, service_handle, schema=None,
+                                     supports_response=SupportsResponse.OPTIONAL)
+        hass.services.async_register(DOMAIN, SERVICE_PAGE_OFF, service_handle, schema=None,
+                                     supports_response=SupportsResponse.OPTIONAL)
         hass.services.async_register(DOMAIN, SERVICE_MUTE, service_handle, schema=None)
         hass.services.async_register(DOMAIN, SERVICE_UNMUTE, service_handle, schema=None)
         hass.services.async_register(DOMAIN, SERVICE_ALL_OFF, service_handle, schema=None)
-
-    async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
-        await hass.config_entries.async_reload(entry.entry_id)
+        hass.services.async_register(DOMAIN, SERVICE_SNAPSHOT, service_handle, schema=None)
+        hass.services.async_register(DOMAIN, SERVICE_RESTORE, service_handle, schema=None,
+                                     supports_response=SupportsResponse.OPTIONAL)
+        hass.services.async_register(DOMAIN, SERVICE_APPLY_STATE, service_handle,
+                                     schema=APPLY_STATE_SCHEMA,
+                                     supports_response=SupportsResponse.OPTIONAL)
 
     entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
+    await er.async_migrate_entries(
+        hass, entry.entry_id, lambda entity_entry: _migrate_unique_id(entry, entity_entry))
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
     # Remove entities for zones that are no longer configured
-    valid_zone_ids = set(zones.keys())
-    expected_unique_ids = {'nuvo_simple_zone_0'}
-    for zone_id in valid_zone_ids:
-        expected_unique_ids.update([
-            f'nuvo_simple_zone_{zone_id}',
-            f'nuvo_simple_zone_{zone_id}_bass',
-            f'nuvo_simple_zone_{zone_id}_treble',
-            f'nuvo_simple_zone_{zone_id}_volume_offset',
-            f'nuvo_simple_zone_{zone_id}_balance',
-            f'nuvo_simple_zone_{zone_id}_source_group',
-            f'nuvo_simple_zone_{zone_id}_volume_reset',
-            f'nuvo_simple_zone_{zone_id}_keypad_lock',
-            f'nuvo_simple_zone_{zone_id}_override',
-        ])
+    prefix = coordinator.unique_id_prefix
+    expected_unique_ids = {f'{prefix}_zone_0'}
+    for zone_id in zones:
+        expected_unique_ids.update(_zone_unique_ids(prefix, zone_id))
 
     entity_registry = er.async_get(hass)
-    for entity_entry in list(entity_registry.entities.values()):
+    for entity_entry in er.async_entries_for_config_entry(entity_registry, entry.entry_id):
         if (entity_entry.unique_id
                 and isinstance(entity_entry.unique_id, str)
-                and entity_entry.unique_id.startswith('nuvo_simple_zone_')
+                and entity_entry.unique_id.startswith(f'{prefix}_zone_')
                 and entity_entry.unique_id not in expected_unique_ids):
             _LOGGER.info("Removing stale entity: %s", entity_entry.entity_id)
             entity_registry.async_remove(entity_entry.entity_id)
@@ -233,12 +551,24 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    nuvo = hass.data.get(DOMAIN, {}).get('nuvo')
+    data = hass.data.get(DOMAIN, {}).get(entry.entry_id, {})
+    nuvo = data.get('nuvo')
+    coordinator = data.get('coordinator')
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
+        if coordinator:
+            await coordinator.async_save()
+            coordinator.async_shutdown()
         if nuvo:
-            await hass.async_add_executor_job(nuvo.close)
-        hass.data.pop(DOMAIN, None)
-        for svc in [SERVICE_PAGE_ON, SERVICE_PAGE_OFF, SERVICE_MUTE, SERVICE_UNMUTE, SERVICE_ALL_OFF]:
-            hass.services.async_remove(DOMAIN, svc)
+            await nuvo.async_close()
+        hass.data[DOMAIN].pop(entry.entry_id, None)
+        if not hass.data[DOMAIN]:
+            for svc in [SERVICE_PAGE_ON, SERVICE_PAGE_OFF, SERVICE_MUTE, SERVICE_UNMUTE, SERVICE_ALL_OFF,
+                        SERVICE_RAMP_VOLUME, SERVICE_SNAPSHOT, SERVICE_RESTORE, SERVICE_APPLY_STATE]:
+                hass.services.async_remove(DOMAIN, svc)
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the state saved for a config entry."""
+    await Store(hass, STORAGE_VERSION, f'{DOMAIN}.{entry.entry_id}').async_remove()
@@ -15,7 +15,8 @@ from homeassistant.const import STATE_OFF, STATE_ON
 from . import (
     DOMAIN as COMPONENT_DOMAIN,
     MODEL,
-    DATA_NUVO,
+    async_add_zone_entities,
+    legacy_entry_data,
     ZONE_SCHEMA,
     CONF_ZONES,
     ZONE_IDS,
@@ -26,15 +27,17 @@ DOMAIN = 'binary_sensor'
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up Nuvo binary sensor entities from a config entry."""
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    model = hass.data[COMPONENT_DOMAIN][MODEL]
-    entities = []
-    for zone_id, extra in zones.items():
-        if model == 'ESSENTIA_D':
-            _LOGGER.info("Adding binary sensor entity for zone %d - %s", zone_id, extra[CONF_NAME])
-            entities.append(NuvoOverride(nuvo, zone_id, extra[CONF_NAME]))
-    async_add_entities(entities, True)
+    data = hass.data[COMPONENT_DOMAIN][entry.entry_id]
+    coordinator = data['coordinator']
+    model = data[MODEL]
+
+    def zone_entities(zone_id, zone_name):
+        if model != 'ESSENTIA_D':
+            return []
+        _LOGGER.info("Adding binary sensor entity for zone %d - %s", zone_id, zone_name)
+        return [NuvoOverride(coordinator, zone_id, zone_name)]
+
+    async_add_zone_entities(hass, entry, async_add_entities, zone_entities)
 
 
 async def async_setup_platform(
@@ -42,53 +45,74 @@ async def async_setup_platform(
     config: ConfigType,
     async_add_entities: AddEntitiesCallback,
     discovery_info: None) -> None:
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    hass.data[DATA_NUVO][DOMAIN] = []
+    data = legacy_entry_data(hass)
+    coordinator = data['coordinator']
+    zones = data[CONF_ZONES]
+    entities = []
 
     for zone_id, extra in zones.items():
-        if hass.data[DATA_NUVO][MODEL] == 'ESSENTIA_D':
+        if data[MODEL] == 'ESSENTIA_D':
             _LOGGER.info("Adding binary sensor entity for zone %d - %s", zone_id, extra[CONF_NAME])
-            hass.data[DATA_NUVO][DOMAIN].append(NuvoOverride(nuvo, zone_id, extra[CONF_NAME]))
+            entities.append(NuvoOverride(coordinator, zone_id, extra[CONF_NAME]))
 
-    async_add_entities(hass.data[DATA_NUVO][DOMAIN], True)
+    async_add_entities(entities)
 
 class NuvoOverride(BinarySensorEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name):
+    def __init__(self, coordinator, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
 
+        self._override = None
+        self._stale = False
+
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
-        self.update()
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('override',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (override) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            self._override = None
-            return None
-        else:
-            self._override = state.override
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        zone = self._coordinator.zones[self._zone_id]
+        self._override = zone.override
+        self._stale = 'override' in zone.stale
+
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        if zone_name != self._name:
+            self._name = zone_name
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_override"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_override"
+
+    @property
+    def extra_state_attributes(self):
+        """Flag a value from the last run the amp has not confirmed yet."""
+        return {'stale': self._stale}
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def name(self):
         """Return the name of the zone."""
@@ -8,11 +8,14 @@ from homeassistant.core import callback
 from . import (
     DOMAIN,
     CONF_BAUD, CONF_PAGE_SOURCE, CONF_PAGE_VOLUME, CONF_ALL_OFF_RECALL,
-    CONF_MIN_OFFSET, CONF_MAX_OFFSET, CONF_ZONES, CONF_SOURCES,
+    CONF_MIN_OFFSET, CONF_MAX_OFFSET, CONF_OPTIMISTIC, CONF_STATISTICS,
+    CONF_METRICS, CONF_ZONES, CONF_SOURCES,
     CONF_ZONE_PAGE_VOLUME,
     DEFAULT_BAUD, DEFAULT_PAGE_SOURCE, DEFAULT_PAGE_VOLUME,
     DEFAULT_MIN_OFFSET, DEFAULT_MAX_OFFSET,
 )
+from .connection import NuvoConnection
+from .protocol import MODEL_UNKNOWN
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +28,9 @@ def _connection_schema(data):
         vol.Optional(CONF_ALL_OFF_RECALL, default=data.get(CONF_ALL_OFF_RECALL, False)): bool,
         vol.Optional(CONF_MIN_OFFSET, default=data.get(CONF_MIN_OFFSET, DEFAULT_MIN_OFFSET)): str,
         vol.Optional(CONF_MAX_OFFSET, default=data.get(CONF_MAX_OFFSET, DEFAULT_MAX_OFFSET)): str,
+        vol.Optional(CONF_OPTIMISTIC, default=data.get(CONF_OPTIMISTIC, False)): bool,
+        vol.Optional(CONF_STATISTICS, default=data.get(CONF_STATISTICS, False)): bool,
+        vol.Optional(CONF_METRICS, default=data.get(CONF_METRICS, False)): bool,
     })
 
 
@@ -90,16 +96,12 @@ class NuvoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Handle the initial connection step."""
         errors = {}
         if user_input is not None:
+            self._async_abort_entries_match({CONF_PORT: user_input[CONF_PORT]})
+            nuvo = NuvoConnection(user_input[CONF_PORT], DEFAULT_BAUD)
             try:
-                from nuvo_simple import get_nuvo
-                nuvo = await self.hass.async_add_executor_job(
-                    get_nuvo,
-                    user_input[CONF_PORT],
-                    9600,
-                    user_input[CONF_ALL_OFF_RECALL],
-                )
-                model = await self.hass.async_add_executor_job(nuvo.get_model)
-                if model == 'Unknown':
+                await nuvo.async_open()
+                model = await nuvo.async_get_model()
+                if model == MODEL_UNKNOWN:
                     errors['base'] = 'cannot_detect_model'
                 else:
                     self._data.update(user_input)
@@ -108,6 +110,8 @@ class NuvoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             except Exception:
                 _LOGGER.exception("Error connecting to Nuvo")
                 errors['base'] = 'cannot_connect'
+            finally:
+                await nuvo.async_close()
 
         return self.async_show_form(
             step_id='user',
@@ -0,0 +1,695 @@
+"""Asyncio serial/socket link to a Nuvo amplifier."""
+import asyncio
+import logging
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import serial_asyncio_fast
+
+from .protocol import (
+    EOL,
+    MODEL_UNKNOWN,
+    Busy,
+    Error,
+    Version,
+    format_version_request,
+    message_key,
+    parse_response,
+    reply_key,
+)
+from .pacing import NuvoPacer
+
+_LOGGER = logging.getLogger(__name__)
+
+TIMEOUT_RESPONSE = 1     # Number of seconds before command response timeout
+RECONNECT_DELAY_MIN = 1  # Seconds before the first attempt to reopen the link, doubling
+RECONNECT_DELAY_MAX = 60
+FAILURE_LIMIT = 5        # Requests in a row without a reply before the amp is considered gone
+COALESCE_INTERVAL = 0.25  # Minimum time between two commands for the same zone and field
+                          # once a queued one has been replaced by a newer value
+MODEL_ATTEMPTS = 10
+MISMATCH_LIMIT = 3       # Unexpected replies in a row before the model is questioned
+BUSY_RETRIES = 2         # Times a request the amp was too busy for is written again
+
+# Priority classes, the writer always takes the lowest number first
+PRIORITY_URGENT = 0      # Paging and commands to all zones
+PRIORITY_USER = 1        # Commands from entities and services
+PRIORITY_READ = 2        # Status queries and reconciliation
+STARVATION_TIME = 1      # Seconds a read may wait before it goes ahead of user commands
+
+# Health of the link
+HEALTH_CONNECTED = 'connected'        # Port open and the amp answering
+HEALTH_DEGRADED = 'degraded'          # Port open but the amp stopped answering
+HEALTH_DISCONNECTED = 'disconnected'  # Port closed, reopening it
+
+
+class NuvoCommand(object):
+    """A request waiting for the writer.
+
+    ``key`` identifies the zone and field the request sets, as a
+    ``(zone, field)`` tuple, or is None for requests that must never be
+    merged with another one.
+    """
+
+    def __init__(self, request, key=None, batch=None, priority=PRIORITY_USER):
+        loop = asyncio.get_running_loop()
+        self.request = request
+        self.key = key
+        self.batch = batch
+        self.priority = priority
+        self.queued_at = loop.time()
+        self.future = loop.create_future()
+        # Resolves to the message answering the request, or None if the
+        # amp did not answer in time or rejected it
+        self.reply = loop.create_future()
+        self.reply_key = None
+        self.sent_at = None
+        self.received_at = None
+        self.retries = 0
+        # A newer value replaced the request while it was queued
+        self.replaced = False
+        # Version query asking a silent amp whether it is back
+        self.probe = False
+        self._timeout = None
+
+
+class NuvoConnection(object):
+    """Nuvo amplifier link driven by the event loop.
+
+    ``port_url`` is either a serial device or a ``socket://host:port``
+    URL.  Requests are queued by ``send`` and written by a single writer
+    task, so callers on the event loop never wait for the line.  A keyed
+    request replaces one for the same key that is still queued.  A
+    request that has replaced another goes out no sooner than
+    ``COALESCE_INTERVAL`` after the last one for its key, so dragging a
+    slider sends the final value and only a bounded number of the values
+    in between, while a single change goes out right away.  ``async_send_batch``
+    writes a set of requests without other requests in between and
+    matches the replies as they arrive.  An unordered batch is queued
+    as separate requests, so urgent ones are not held up behind it.
+
+    Writes are spaced by a ``NuvoPacer``, which learns how long the amp
+    takes for each command type and how many requests may wait for a
+    reply at once, and backs off when the amp stops keeping up.  A
+    request the amp answers busy to is written again.
+
+    Every request has a priority class.  Between two writes the writer
+    takes urgent requests, like paging, before user commands and those
+    before status reads, except that a read that has waited
+    ``STARVATION_TIME`` goes ahead of user commands.  A request that is
+    already being written is never interrupted.  Every line received is
+    parsed and handed to ``message_callback`` on the event loop.  If
+    several replies in a row do not fit the protocol of ``model``,
+    ``mismatch_callback`` is called.
+
+    ``health`` is one of the ``HEALTH_*`` states, and ``health_callback``
+    is called with the new one when it changes.  A lost port is reopened
+    with exponential backoff, and an amp that stops answering is asked
+    for its version, also with backoff, until it answers again.  In
+    between, the circuit is open: requests fail right away instead of
+    waiting for timeouts, and queued ones are dropped.
+
+    ``busy_time`` and ``busy_time_max`` hold the total and longest time,
+    in seconds, spent on the event loop queueing requests and handling
+    received lines.  Set ``stats`` to a ``NuvoStats`` to collect link
+    statistics, it is None while they are disabled.
+    """
+
+    def __init__(self, port_url, baud):
+        self.port_url = port_url
+        self.baud = int(baud)
+        self.model = None
+        self.message_callback = None
+        self.mismatch_callback = None
+        self.health = None
+        self.health_callback = None
+
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._write_task = None
+        # One queue per priority class
+        self._queues = (deque(), deque(), deque())
+        self._queued_keys = {}
+        # Members of the batch being written that are still to be written
+        self._batch_queue = None
+        self._key_sent_at = {}
+        # Newest command for each key the writer has taken from the queue
+        self._key_taken = {}
+        self._inflight = deque()
+        self._pacer = NuvoPacer(self.baud)
+        self._queue_event = asyncio.Event()
+        self._reply_event = asyncio.Event()
+        self._model_event = asyncio.Event()
+        self._connected = asyncio.Event()
+        self._mismatches = 0
+        self._failures = 0
+        self._probe_task = None
+        self._closing = False
+
+        self.busy_time = 0.0
+        self.busy_time_max = 0.0
+        self.stats = None
+
+    async def async_open(self, lazy=False):
+        """Open the link and start listening.
+
+        Raises OSError if the port can not be opened, unless lazy is set,
+        in which case opening is retried in the background.
+        """
+        self._closing = False
+        try:
+            await self._async_open_port()
+        except OSError:
+            if not lazy:
+                raise
+            _LOGGER.warning('Unable to open "%s" yet, retrying in the background.',
+                            self.port_url)
+            self._set_health(HEALTH_DISCONNECTED)
+        loop = asyncio.get_running_loop()
+        self._read_task = loop.create_task(self._async_read_loop())
+        self._write_task = loop.create_task(self._async_write_loop())
+
+    async def _async_open_port(self):
+        _LOGGER.info('Attempting connection - "%s" at %s baud', self.port_url, self.baud)
+        if self.port_url.startswith('socket://'):
+            url = urlparse(self.port_url)
+            self._reader, self._writer = await asyncio.open_connection(url.hostname, url.port)
+        else:
+            self._reader, self._writer = await serial_asyncio_fast.open_serial_connection(
+                url=self.port_url, baudrate=self.baud)
+        self._connected.set()
+        self._failures = 0
+        self._set_health(HEALTH_CONNECTED)
+
+    async def async_close(self):
+        """Stop listening and close the link."""
+        self._closing = True
+        for task in (self._read_task, self._write_task, self._probe_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._read_task = None
+        self._write_task = None
+        self._probe_task = None
+        self._close_port()
+        self._fail_pending()
+
+    def _fail_pending(self):
+        """Fail every queued request and every one waiting for a reply."""
+        for queue in self._queues:
+            while queue:
+                command = queue.popleft()
+                if not command.future.done():
+                    command.future.set_result(False)
+                self._resolve(command, None)
+        self._queued_keys.clear()
+        while self._inflight:
+            self._resolve(self._inflight.popleft(), None)
+
+    def _close_port(self):
+        self._connected.clear()
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+    @property
+    def circuit_open(self):
+        """True while requests fail right away because the amp is unreachable."""
+        return self.health in (HEALTH_DEGRADED, HEALTH_DISCONNECTED)
+
+    def _set_health(self, health):
+        if health == self.health:
+            return
+        if health == HEALTH_CONNECTED:
+            _LOGGER.info('Nuvo link is up')
+        else:
+            _LOGGER.warning('Nuvo link is %s, failing requests until it recovers', health)
+        self.health = health
+        if self.circuit_open:
+            self._fail_pending()
+        if health == HEALTH_DEGRADED and not self._closing:
+            self._probe_task = asyncio.get_running_loop().create_task(self._async_probe())
+        if self.health_callback is not None:
+            self.health_callback(health)
+
+    async def _async_probe(self):
+        """Ask a silent amp for its version, backing off, until it answers."""
+        delay = RECONNECT_DELAY_MIN
+        while self.health == HEALTH_DEGRADED:
+            command = NuvoCommand(format_version_request(), priority=PRIORITY_URGENT)
+            command.probe = True
+            self._enqueue(command)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def async_wait_connected(self):
+        """Wait until the link is open."""
+        await self._connected.wait()
+
+    async def async_get_model(self):
+        """Ask the amp for its version until it answers."""
+        self._model_event.clear()
+        for attempt in range(MODEL_ATTEMPTS):
+            if attempt and self.stats is not None:
+                self.stats.retries += 1
+            self.send(format_version_request())
+            try:
+                await asyncio.wait_for(self._model_event.wait(), TIMEOUT_RESPONSE)
+            except asyncio.TimeoutError:
+                continue
+            return self.model
+        _LOGGER.error('This does not appear to be a supported Nuvo device.')
+        return MODEL_UNKNOWN
+
+    @property
+    def queue_depth(self):
+        """Number of requests waiting for the writer."""
+        return sum(len(queue) for queue in self._queues)
+
+    @property
+    def inflight(self):
+        """Number of requests written and still waiting for a reply."""
+        return len(self._inflight)
+
+    @property
+    def pacing(self):
+        """What the pacer has learned, for diagnostics."""
+        return self._pacer.as_dict()
+
+    def _account(self, start):
+        elapsed = time.perf_counter() - start
+        self.busy_time += elapsed
+        if elapsed > self.busy_time_max:
+            self.busy_time_max = elapsed
+
+    def send(self, request: str, key=None, priority=PRIORITY_USER) -> asyncio.Future:
+        """Queue a request and return without waiting for the line.
+
+        If a request with the same key is still queued it is replaced,
+        moving it to the queue of the new priority, and its future is
+        returned instead.  The returned future resolves to
+        True once the request has been written, or False if it could not
+        be sent, which it is right away while the circuit is open.
+        """
+        if self.circuit_open:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(False)
+            return future
+        start = time.perf_counter()
+        command = self._queued_keys.get(key) if key is not None else None
+        if command is not None:
+            _LOGGER.debug('Replacing queued "%s" with "%s"', command.request, request)
+            command.request = request
+            command.replaced = True
+            if command.priority != priority:
+                self._queues[command.priority].remove(command)
+                command.priority = priority
+                self._queues[priority].append(command)
+        else:
+            command = NuvoCommand(request, key, priority=priority)
+            self._enqueue(command)
+        self._account(start)
+        return command.future
+
+    def _enqueue(self, command):
+        self._queues[command.priority].append(command)
+        if command.key is not None:
+            self._queued_keys[command.key] = command
+        self._queue_event.set()
+        if self.stats is not None:
+            self.stats.record_queue_depth(self.queue_depth)
+
+    async def async_send(self, request: str, key=None, priority=PRIORITY_USER):
+        """Send a request and wait until it has been written."""
+        return await self.send(request, key, priority)
+
+    def is_queued(self, key):
+        """True if a request for the key is waiting for the writer."""
+        return key in self._queued_keys
+
+    def discard(self, keys):
+        """Drop the queued requests for any of the keys.
+
+        Used by urgent requests that would otherwise be undone by older
+        requests they overtake.  Returns the keys that were dropped.
+        """
+        dropped = []
+        for queue in self._queues:
+            for command in [command for command in queue if command.key in keys]:
+                queue.remove(command)
+                del self._queued_keys[command.key]
+                if not command.future.done():
+                    command.future.set_result(False)
+                self._resolve(command, None)
+                dropped.append(command.key)
+        if dropped:
+            _LOGGER.debug('Dropped queued requests for %s', dropped)
+        return dropped
+
+    async def async_send_batch(self, requests, priority=PRIORITY_USER, ordered=True):
+        """Write a set of requests in order and wait for the replies.
+
+        No other request is written in between.  Zones that are powered on
+        by the batch need a moment before they accept more commands, so put
+        power on requests first.  Requests that need no such ordering,
+        like a sweep of status reads, can be sent with ordered False,
+        which lets more urgent requests go between them.
+
+        :param requests: list of request strings
+        :param priority: priority class of the whole batch
+        :param ordered: keep other requests from going in between
+        :return: list with the message answering each request, or None
+                 where the amp did not answer
+        """
+        if self.circuit_open:
+            return [None] * len(requests)
+        start = time.perf_counter()
+        batch = []
+        for request in requests:
+            batch.append(NuvoCommand(request, batch=batch if ordered else None,
+                                     priority=priority))
+        self._queues[priority].extend(batch)
+        self._queue_event.set()
+        if self.stats is not None:
+            self.stats.record_queue_depth(self.queue_depth)
+        self._account(start)
+        return list(await asyncio.gather(*[command.reply for command in batch]))
+
+    def _next_command(self, now):
+        """Find the next command that may be written.
+
+        Returns the command, or None and the time until one held back by
+        ``COALESCE_INTERVAL`` becomes ready.
+        """
+        urgent, user, read = self._queues
+        if read and now - read[0].queued_at >= STARVATION_TIME:
+            order = (urgent, read, user)
+        else:
+            order = self._queues
+        wait = None
+        for queue in order:
+            command, queue_wait = self._next_in_queue(queue, now)
+            if command is not None:
+                return command, None
+            if queue_wait is not None and (wait is None or queue_wait < wait):
+                wait = queue_wait
+        return None, wait
+
+    def _next_in_queue(self, queue, now):
+        """Find the next command of one priority class.
+
+        Commands for other zones may overtake a held command, but nothing
+        overtakes one for the same zone and unkeyed commands overtake
+        nothing.
+        """
+        held_zones = set()
+        wait = None
+        for command in queue:
+            if command.key is None:
+                if held_zones:
+                    break
+                return command, None
+            if command.key[0] in held_zones:
+                continue
+            if not command.replaced:
+                return command, None
+            ready_at = self._key_sent_at.get(command.key, 0) + COALESCE_INTERVAL
+            if ready_at <= now:
+                return command, None
+            held_zones.add(command.key[0])
+            if wait is None or ready_at - now < wait:
+                wait = ready_at - now
+        return None, wait
+
+    async def _async_write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            command, wait = self._next_command(loop.time())
+            if command is None:
+                self._queue_event.clear()
+                try:
+                    await asyncio.wait_for(self._queue_event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if command.batch is not None:
+                queue = self._queues[command.priority]
+                for member in command.batch:
+                    queue.remove(member)
+                result = await self._async_write_batch(command.batch)
+                for member in command.batch:
+                    if not member.future.done():
+                        member.future.set_result(result)
+                continue
+            self._queues[command.priority].remove(command)
+            if command.key is not None:
+                del self._queued_keys[command.key]
+                self._key_sent_at[command.key] = loop.time()
+                self._key_taken[command.key] = command
+            result = await self._async_write(command)
+            if not command.future.done():
+                command.future.set_result(result)
+
+    async def _async_pace(self, command):
+        """Wait until the pacer allows the request to be written."""
+        loop = asyncio.get_running_loop()
+        expects_reply = reply_key(command.request) is not None
+        while True:
+            delay = self._pacer.delay(command.request, expects_reply, len(self._inflight),
+                                      loop.time())
+            if delay == 0:
+                return
+            if delay is None:
+                # Replies and timeouts both free a place in the window
+                self._reply_event.clear()
+                try:
+                    await asyncio.wait_for(self._reply_event.wait(), TIMEOUT_RESPONSE)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(delay)
+
+    async def _async_write(self, command):
+        """Write a request as soon as the pacer allows it."""
+        await self._async_pace(command)
+        request = command.request
+        # The link may have gone down while waiting for the pacer
+        if self._writer is None or (self.circuit_open and not command.probe):
+            _LOGGER.error('Nuvo link is %s, dropping "%s"', self.health, request)
+            if not command.future.done():
+                command.future.set_result(False)
+            self._resolve(command, None)
+            return False
+        _LOGGER.debug('Sending "%s"', request)
+        try:
+            frame = ('*' + request + '\r').encode()
+            self._writer.write(frame)
+            if self.stats is not None:
+                self.stats.record_sent(request, len(frame))
+            self._track(command)
+            await self._writer.drain()
+        except OSError:
+            _LOGGER.error('Unexpected port error when sending command.')
+            return False
+        return True
+
+    async def _async_write_batch(self, batch):
+        """Write a batch, paced like single requests but without others in between.
+
+        A member the amp answers busy to is written again before the rest
+        of the batch, so the batch is done once every member is answered.
+        """
+        _LOGGER.debug('Sending batch %s', [command.request for command in batch])
+        self._batch_queue = deque(batch)
+        try:
+            while True:
+                while self._batch_queue:
+                    command = self._batch_queue.popleft()
+                    if not await self._async_write(command):
+                        for rest in self._batch_queue:
+                            self._resolve(rest, None)
+                        return False
+                if all(command.reply.done() for command in batch):
+                    return True
+                # Replies, timeouts and busy retries all set the event
+                self._reply_event.clear()
+                try:
+                    await asyncio.wait_for(self._reply_event.wait(), TIMEOUT_RESPONSE)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._batch_queue = None
+
+    def _track(self, command):
+        """Wait for the reply to a request that has just been written."""
+        key = reply_key(command.request)
+        command.received_at = self._pacer.written(
+            command.request, key is not None, asyncio.get_running_loop().time())
+        if key is None:
+            self._resolve(command, None)
+            return
+        command.reply_key = key
+        command.sent_at = time.monotonic()
+        command._timeout = asyncio.get_running_loop().call_later(
+            TIMEOUT_RESPONSE, self._expire, command)
+        self._inflight.append(command)
+
+    def _expire(self, command):
+        _LOGGER.debug('No reply to "%s"', command.request)
+        try:
+            self._inflight.remove(command)
+        except ValueError:
+            return
+        self._pacer.failed()
+        if self.stats is not None:
+            self.stats.record_timeout(command.request)
+        self._resolve(command, None)
+        self._failures += 1
+        if self._failures >= FAILURE_LIMIT and self.health == HEALTH_CONNECTED:
+            self._set_health(HEALTH_DEGRADED)
+
+    def _resolve(self, command, message, reply_length=0):
+        if command._timeout is not None:
+            command._timeout.cancel()
+            command._timeout = None
+            self._reply_event.set()
+        if not command.reply.done():
+            command.reply.set_result(message)
+            if message is not None:
+                self._pacer.answered(command.request, command.received_at, reply_length,
+                                     asyncio.get_running_loop().time())
+                if self.stats is not None:
+                    self.stats.record_latency(command.request,
+                                              time.monotonic() - command.sent_at)
+
+    def _retry(self, command):
+        """Queue a request the amp was too busy for again, ahead of the rest.
+
+        A batch member goes back into its batch.  A keyed request keeps
+        its key, unless a newer value for it is queued or being written
+        already, which makes the retry unnecessary.
+        """
+        command._timeout.cancel()
+        command._timeout = None
+        command.retries += 1
+        if command.batch is not None and self._batch_queue is not None:
+            self._batch_queue.appendleft(command)
+        elif command.key is not None and (command.key in self._queued_keys
+                                          or self._key_taken[command.key] is not command):
+            self._resolve(command, None)
+        else:
+            self._queues[command.priority].appendleft(command)
+            if command.key is not None:
+                self._queued_keys[command.key] = command
+            self._queue_event.set()
+        self._reply_event.set()
+        if self.stats is not None:
+            self.stats.retries += 1
+
+    def _mismatch(self):
+        self._mismatches += 1
+        if self._mismatches == MISMATCH_LIMIT and self.mismatch_callback is not None:
+            self.mismatch_callback()
+
+    def _match_reply(self, message, reply_length):
+        """Hand a message to the oldest request waiting for it."""
+        if isinstance(message, (Error, Busy)):
+            if self.stats is not None:
+                if isinstance(message, Error):
+                    self.stats.errors += 1
+                else:
+                    self.stats.busy += 1
+            if isinstance(message, Busy):
+                self._pacer.failed()
+            if self._inflight:
+                command = self._inflight.popleft()
+                if isinstance(message, Busy) and command.retries < BUSY_RETRIES:
+                    self._retry(command)
+                    return
+                # Every model answers the status queries of its own protocol
+                if (isinstance(message, Error)
+                        and command.request.endswith(('CONSR', 'STATUS', 'SETSR'))):
+                    self._mismatch()
+                self._resolve(command, None)
+            return
+        key = message_key(message)
+        if key is not None:
+            for command in self._inflight:
+                if command.reply_key == key:
+                    self._inflight.remove(command)
+                    self._mismatches = 0
+                    self._resolve(command, message, reply_length)
+                    return
+        if self.stats is not None:
+            self.stats.record_unsolicited(key[-1] if key else 'all')
+
+    async def _async_read_loop(self):
+        while not self._closing:
+            if self._reader is None:
+                await self._async_reopen()
+                continue
+            try:
+                line = await self._reader.readuntil(EOL)
+            except asyncio.LimitOverrunError as err:
+                # Garbage without a separator, drop it
+                await self._reader.readexactly(err.consumed)
+                continue
+            except (asyncio.IncompleteReadError, OSError):
+                if self._closing:
+                    return
+                _LOGGER.error('Unexpected port error, retrying.')
+                await self._async_reopen()
+                continue
+            start = time.perf_counter()
+            if self.stats is not None:
+                self.stats.bytes_in += len(line)
+            self._handle_line(line.decode('ascii', errors='replace').strip())
+            self._account(start)
+
+    async def _async_reopen(self):
+        self._close_port()
+        self._set_health(HEALTH_DISCONNECTED)
+        delay = RECONNECT_DELAY_MIN
+        while not self._closing:
+            await asyncio.sleep(delay)
+            if self.stats is not None:
+                self.stats.retries += 1
+            try:
+                await self._async_open_port()
+                if self.stats is not None:
+                    self.stats.reconnects += 1
+                return
+            except OSError:
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+                _LOGGER.error('Unable to reopen "%s", retrying in %d s.', self.port_url, delay)
+
+    def _handle_line(self, line):
+        _LOGGER.debug('Received: %s', line)
+        if not line:
+            return
+        message = parse_response(line, self.model)
+        if message is None:
+            _LOGGER.warning('NO MATCH - %s', line)
+            self._pacer.failed()
+            self._mismatch()
+            return
+        self._failures = 0
+        if self.health == HEALTH_DEGRADED:
+            self._set_health(HEALTH_CONNECTED)
+        if isinstance(message, Version):
+            _LOGGER.info('Nuvo returned model %s', message.model)
+            self.model = message.model
+            self._model_event.set()
+        elif isinstance(message, Error):
+            _LOGGER.error('Received error response from Nuvo on last command')
+        elif isinstance(message, Busy):
+            _LOGGER.warning('BUSY RESPONSE - TRY AGAIN')
+        self._match_reply(message, len(line) + 2)
+        if self.message_callback is not None:
+            self.message_callback(message)
@@ -0,0 +1,1044 @@
+"""Shared zone state for the Nuvo Classic entities."""
+import asyncio
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .connection import HEALTH_CONNECTED, PRIORITY_READ, PRIORITY_URGENT, PRIORITY_USER
+from .protocol import (
+    VOLUME_MAX,
+    VOLUME_MIN,
+    AllOff,
+    KeypadLock,
+    ZoneStatus,
+    ZonesetStatus,
+    db_to_percent,
+    percent_to_db,
+    format_all_off,
+    format_mute_all,
+    format_set_balance,
+    format_set_bass,
+    format_set_group,
+    format_set_keypad_lock,
+    format_set_mute,
+    format_set_power,
+    format_set_source,
+    format_set_treble,
+    format_set_volume,
+    format_set_volume_reset,
+    format_unmute_all,
+    format_zone_status_request,
+    format_zoneset_status_request,
+)
+from .ramp import plan_ramp
+
+_LOGGER = logging.getLogger(__name__)
+
+OPTIMISTIC_TIMEOUT = 3   # Seconds to wait for the amp to confirm a commanded value
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 10          # Seconds to collect changes before the snapshot is written
+# Fields kept across restarts
+STORED_FIELDS = ('power', 'source', 'volume', 'mute', 'bass', 'treble', 'balance',
+                 'group', 'volume_reset', 'override', 'keypad_lock', 'volume_offset')
+# Fields paging changes and restores
+PAGE_FIELDS = ('power', 'source', 'volume', 'mute')
+# Fields snapshots capture and restore, settings before power and media
+SNAPSHOT_FIELDS = ('bass', 'treble', 'balance', 'group', 'volume_offset',
+                   'power', 'source', 'volume', 'mute')
+# Fields apply_state sets, in the order they are sent.  Power on is
+# moved to the front of the batch, power off stays at the end.
+APPLY_FIELDS = ('source', 'volume', 'mute', 'bass', 'treble', 'balance', 'volume_offset',
+                'power')
+# Fields whose commands stop a volume ramp on the zone
+RAMP_FIELDS = ('power', 'volume', 'mute')
+# Stored fields that only the amp can confirm
+AMP_FIELDS = ('power', 'source', 'volume', 'mute', 'bass', 'treble', 'balance',
+              'group', 'volume_reset', 'override')
+
+
+_FORMATTERS = {
+    'power': format_set_power,
+    'source': format_set_source,
+    'volume': format_set_volume,
+    'mute': format_set_mute,
+    'bass': format_set_bass,
+    'treble': format_set_treble,
+    'balance': format_set_balance,
+    'group': format_set_group,
+    'volume_reset': format_set_volume_reset,
+    'keypad_lock': format_set_keypad_lock,
+}
+
+
+class ZoneState(object):
+    """Last known state of a single zone."""
+
+    def __init__(self, zone_id):
+        self.zone_id = zone_id
+        # Media
+        self.power = None
+        self.source = None
+        self.volume = None
+        self.mute = None
+        self.group_members = None
+        # Settings
+        self.bass = None
+        self.treble = None
+        self.balance = None
+        self.volume_offset = 0
+        self.group = None
+        self.volume_reset = None
+        self.keypad_lock = False
+        self.override = None
+        # Fields loaded from the last run the amp has not reported yet
+        self.stale = set()
+
+
+class GroupTopology(object):
+    """Speaker groups: the zones following each leading zone.
+
+    A zone follows at most one leader, and a zone that follows another
+    one leads no group of its own.
+    """
+
+    def __init__(self, zone_ids):
+        self._members = {zone_id: [] for zone_id in zone_ids}
+
+    def add_zone(self, zone_id):
+        self._members[zone_id] = []
+
+    def remove_zone(self, zone_id):
+        """Take a zone out of its group and release its followers."""
+        self.leave(zone_id)
+        del self._members[zone_id]
+
+    def members(self, zone_id):
+        """Zones following zone_id, in the order they joined."""
+        return self._members.get(zone_id, [])
+
+    def leader(self, zone_id):
+        """Zone that zone_id follows, or None."""
+        for leader_id, members in self._members.items():
+            if zone_id in members:
+                return leader_id
+        return None
+
+    def join(self, leader_id, member_ids):
+        """Make member_ids follow leader_id.
+
+        Members leave the group they were in and release their own
+        followers, and the leader stops following anyone.  Returns the
+        members that joined.
+        """
+        joined = []
+        for member_id in member_ids:
+            if member_id == leader_id or member_id not in self._members:
+                continue
+            self._members[member_id] = []
+            for other_id, members in self._members.items():
+                if other_id != leader_id and leader_id in members:
+                    members.remove(leader_id)
+                if other_id != member_id and member_id in members:
+                    members.remove(member_id)
+            self._members[leader_id].append(member_id)
+            joined.append(member_id)
+        return joined
+
+    def leave(self, zone_id):
+        """Take a zone out of every group, it keeps no followers either."""
+        for members in self._members.values():
+            if zone_id in members:
+                members.remove(zone_id)
+        self._members[zone_id] = []
+
+    def as_dict(self):
+        """Leader id -> member ids of every group with members."""
+        return {leader_id: list(members) for leader_id, members in self._members.items() if members}
+
+    def restore(self, groups):
+        """Replace every group by the ones in a dict from as_dict.
+
+        Zones no longer configured are left out.
+        """
+        for members in self._members.values():
+            members.clear()
+        for leader_id, member_ids in groups.items():
+            if leader_id in self._members:
+                self.join(leader_id, member_ids)
+
+
+class NuvoCoordinator(object):
+    """Own a snapshot of every zone and push changes to subscribed entities.
+
+    Everything the amp reports is applied to the snapshot once and handed
+    to every entity on that zone.  Zone 0, the "Group Controller", only
+    exists here, as do speaker groups and the volume offsets they use.
+
+    A commanded value is kept as pending until the amp reports the same
+    value, or for ``OPTIMISTIC_TIMEOUT``, so the same command is not
+    sent twice while the first is on its way.  In optimistic mode it is
+    also put in the snapshot as soon as it is queued, and if the amp
+    does not confirm it in time the last value the amp reported is put
+    back.
+
+    Volume ramps run here as one task per zone, see ``async_ramp_volume``.
+
+    ``available`` follows the health of the link, every entity is
+    unavailable while it is down and the zones are read again once it is
+    back.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id, nuvo, model, zone_ids,
+                 all_off_recall, optimistic=False):
+        self.hass = hass
+        self.entry_id = entry_id
+        self.unique_id_prefix = f'nuvo_simple_{entry_id}'
+        self.nuvo = nuvo
+        self.model = model
+        self.all_off_recall = all_off_recall
+        self.optimistic = optimistic
+        # The link may already be down, a lazy open fails before the
+        # health callback below is attached
+        self.available = nuvo.health == HEALTH_CONNECTED
+        self.zones = {zone_id: ZoneState(zone_id) for zone_id in [0, *zone_ids]}
+        self._listeners = {zone_id: [] for zone_id in self.zones}
+        self._refresh_pending = set()
+        # (zone id, field) -> [commanded value, last reported value, timer]
+        self._pending = {}
+        # (zone id, field) -> value last queued
+        self._commanded = {}
+        # Zone id -> task running a volume ramp on it
+        self._ramps = {}
+        self._media_players = {}
+        self.groups = GroupTopology(self.zones)
+        # Zones switched off by the last keypad All Off
+        self._all_off_zones = set()
+        # Zone id -> (power, source, volume, mute) before paging
+        self._page_saved = None
+        self._page_source = None
+        self._page_volume = {}
+        # (zone id, power on, source, volume) frames, see setup_paging
+        self._page_frames = []
+        # Name -> (zone id -> field -> value, speaker groups), see async_snapshot
+        self._snapshots = {}
+        # Seconds the startup sweep took
+        self.prefetch_time = None
+        # Seconds the last paging on and off took, until the amp answered
+        self.page_on_latency = None
+        self.page_off_latency = None
+
+        group_controller = self.zones[0]
+        group_controller.power = False
+        group_controller.source = 1
+        group_controller.volume = VOLUME_MIN
+        group_controller.mute = False
+
+        self._store = Store(hass, STORAGE_VERSION, f'nuvo_simple.{entry_id}')
+
+        self.nuvo.message_callback = self._async_handle_message
+        self.nuvo.health_callback = self._async_handle_health
+
+    async def async_load(self):
+        """Fill the snapshot with the state saved by the last run.
+
+        Values from amp zones are marked stale until the amp reports
+        them.  Returns False if nothing was saved.
+        """
+        stored = await self._store.async_load()
+        if not stored:
+            return False
+        for zone_id, fields in stored.items():
+            zone = self.zones.get(int(zone_id))
+            if zone is None:
+                continue
+            for field in STORED_FIELDS:
+                if field in fields:
+                    setattr(zone, field, fields[field])
+            if zone.zone_id:
+                zone.stale = {field for field in AMP_FIELDS if field in fields}
+        return True
+
+    @callback
+    def _async_schedule_save(self):
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        data = {}
+        for zone_id, zone in self.zones.items():
+            fields = {field: getattr(zone, field) for field in STORED_FIELDS}
+            for field in STORED_FIELDS:
+                pending = self._pending.get((zone_id, field))
+                if pending is not None:
+                    # Save what the amp reported, not what was commanded
+                    fields[field] = pending[1]
+            data[str(zone_id)] = fields
+        return data
+
+    async def async_save(self):
+        """Write the snapshot now."""
+        await self._store.async_save(self._data_to_save())
+
+    @callback
+    def async_shutdown(self):
+        """Cancel volume ramps and the timers of pending optimistic values."""
+        for zone_id in list(self._ramps):
+            self._async_cancel_ramp(zone_id)
+        for _, _, timer in self._pending.values():
+            timer.cancel()
+        self._pending.clear()
+
+    @callback
+    def async_add_zone(self, zone_id):
+        """Start tracking a zone added in the options."""
+        self.zones[zone_id] = ZoneState(zone_id)
+        self._listeners[zone_id] = []
+        self.groups.add_zone(zone_id)
+
+    @callback
+    def async_remove_zone(self, zone_id):
+        """Stop tracking a zone removed in the options.
+
+        The zone leaves any speaker group and the zones following it are
+        released.
+        """
+        self._async_cancel_ramp(zone_id)
+        for (pending_zone_id, field), (_, _, timer) in list(self._pending.items()):
+            if pending_zone_id == zone_id:
+                timer.cancel()
+                del self._pending[(pending_zone_id, field)]
+        self.groups.remove_zone(zone_id)
+        del self._listeners[zone_id]
+        del self.zones[zone_id]
+        self._media_players.pop(zone_id, None)
+        self._all_off_zones.discard(zone_id)
+        for other_id in self._update_group_members():
+            self._async_notify(other_id, ('group_members',))
+
+    def register_media_player(self, zone_id, entity_id):
+        """Register the media player of a zone.
+
+        Speaker groups are joined by entity id, so this has to wait until
+        the media player entity has been added.
+        """
+        self._media_players[zone_id] = entity_id
+        for other_id in self._update_group_members():
+            if other_id != zone_id:
+                self._async_notify(other_id, ('group_members',))
+
+    def media_player_zone(self, entity_id):
+        """Zone id of a media player entity of this amp, or None."""
+        for zone_id, media_player in self._media_players.items():
+            if media_player == entity_id:
+                return zone_id
+        return None
+
+    @callback
+    def async_add_listener(self, zone_id, update_callback, fields=None):
+        """Subscribe to state changes of a zone, return an unsubscribe callable.
+
+        With fields, a collection of ZoneState attribute names, the
+        callback is only called when one of those changes.
+        """
+        listener = (update_callback, frozenset(fields) if fields is not None else None)
+        self._listeners[zone_id].append(listener)
+
+        @callback
+        def remove_listener():
+            # The zone may already be gone when it was removed in the options
+            if listener in self._listeners.get(zone_id, []):
+                self._listeners[zone_id].remove(listener)
+
+        return remove_listener
+
+    @callback
+    def _async_notify(self, zone_id, fields=None):
+        """Call the listeners of a zone interested in the changed fields.
+
+        None means anything may have changed, like availability.
+        """
+        for update_callback, wanted in list(self._listeners.get(zone_id, [])):
+            if fields is None or wanted is None or not wanted.isdisjoint(fields):
+                update_callback()
+        self._async_schedule_save()
+
+    async def async_prefetch(self):
+        """Read every zone in one sweep.
+
+        Returns the time in seconds the sweep took.
+        """
+        start = time.perf_counter()
+        zone_ids = [zone_id for zone_id in self.zones if zone_id]
+        requests = []
+        for zone_id in zone_ids:
+            requests.append(format_zone_status_request(zone_id, self.model))
+            requests.append(format_zoneset_status_request(zone_id))
+        # Unordered, so paging does not wait for the whole sweep
+        replies = await self.nuvo.async_send_batch(requests, PRIORITY_READ, ordered=False)
+        missing = [zone_id for index, zone_id in enumerate(zone_ids)
+                   if None in replies[2 * index:2 * index + 2]]
+        if missing:
+            _LOGGER.warning('No status from zones %s during startup', missing)
+        self.prefetch_time = time.perf_counter() - start
+        _LOGGER.info('Read %d zones in %.0f ms', len(zone_ids), self.prefetch_time * 1000)
+        return self.prefetch_time
+
+    @callback
+    def async_request_refresh(self, zone_id):
+        """Ask the amp for the state of a zone unless already asked."""
+        if zone_id == 0 or zone_id in self._refresh_pending:
+            return
+        self._refresh_pending.add(zone_id)
+        self.nuvo.send(format_zone_status_request(zone_id, self.model), priority=PRIORITY_READ)
+        self.nuvo.send(format_zoneset_status_request(zone_id),
+                       priority=PRIORITY_READ).add_done_callback(
+            lambda _: self._refresh_pending.discard(zone_id))
+
+    @callback
+    def _async_handle_health(self, health):
+        """Mark the entities unavailable while the link is down."""
+        available = health == HEALTH_CONNECTED
+        if available == self.available:
+            return
+        self.available = available
+        # Catch up with keypad changes made during the outage, unless the
+        # startup sweep has not even run yet
+        if available and self.prefetch_time is not None:
+            self.hass.async_create_task(self.async_prefetch())
+        for zone_id in self.zones:
+            self._async_notify(zone_id)
+
+    @callback
+    def _async_handle_message(self, message):
+        """Apply a message from the amp to the snapshot."""
+        if isinstance(message, ZoneStatus):
+            self._apply_zone_status(message)
+        elif isinstance(message, ZonesetStatus):
+            self._apply_zoneset_status(message)
+        elif isinstance(message, KeypadLock):
+            if message.zone in self.zones:
+                self.zones[message.zone].keypad_lock = message.lock
+                self._async_notify(message.zone, ('keypad_lock',))
+        elif isinstance(message, AllOff):
+            self._apply_keypad_all_off()
+
+    def _apply_field(self, zone, field, value, changed):
+        """Apply a value reported by the amp, honouring a pending command.
+
+        Adds field to the changed set if what the entities show changed.
+        """
+        if field in zone.stale:
+            zone.stale.discard(field)
+            changed.add(field)
+        pending = self._pending.get((zone.zone_id, field))
+        if pending is None:
+            pass
+        elif pending[0] == value:
+            pending[2].cancel()
+            del self._pending[(zone.zone_id, field)]
+        else:
+            pending[1] = value
+            if self.optimistic:
+                # An older value still on its way, keep showing the commanded one
+                return
+        if getattr(zone, field) != value:
+            setattr(zone, field, value)
+            changed.add(field)
+
+    def _apply_zone_status(self, status):
+        zone = self.zones.get(status.zone)
+        if zone is None:
+            return
+        changed = set()
+        self._apply_field(zone, 'power', status.power, changed)
+        if status.source is not None:
+            self._apply_field(zone, 'source', status.source, changed)
+        if status.mute is not None:
+            self._apply_field(zone, 'mute', status.mute, changed)
+        if status.volume is not None:
+            self._apply_field(zone, 'volume', status.volume, changed)
+
+        if zone.power and zone.group:
+            # Nuvo does not send updates for other zones using source
+            # grouping, so follow the source on the ones powered on.
+            for other in self.zones.values():
+                if (other is not zone and other.group and other.power
+                        and other.source != zone.source):
+                    other.source = zone.source
+                    self._async_notify(other.zone_id, ('source',))
+
+        if changed:
+            self._async_notify(status.zone, changed)
+        self._sync_group(status.zone)
+
+    def _apply_zoneset_status(self, status):
+        zone = self.zones.get(status.zone)
+        if zone is None:
+            return
+        changed = set()
+        for field in ('bass', 'treble', 'balance', 'group', 'volume_reset', 'override'):
+            self._apply_field(zone, field, getattr(status, field), changed)
+        if changed:
+            self._async_notify(status.zone, changed)
+
+    def _apply_keypad_all_off(self):
+        """Handle All Off pressed on a keypad.
+
+        Pressing it again while everything is off brings back the zones
+        the first press switched off, if all off recall is enabled.
+        """
+        zones_on = {zone_id for zone_id, zone in self.zones.items() if zone.power}
+        if zones_on:
+            self._all_off_zones = zones_on
+            for zone_id in zones_on:
+                self.zones[zone_id].power = False
+                self._async_notify(zone_id, ('power',))
+            return
+        if self.all_off_recall:
+            for zone_id in sorted(self._all_off_zones):
+                self.async_set_power(zone_id, True)
+        self._all_off_zones = set()
+
+    def _sync_group(self, zone_id):
+        """Make the zones following zone_id match its power, volume, mute and source."""
+        setters = {
+            'power': self.async_set_power,
+            'volume': self.async_set_volume,
+            'mute': self.async_set_mute,
+            'source': self.async_set_source,
+        }
+        for member_id, field, value in self._group_changes(zone_id, self.groups.members(zone_id)):
+            setters[field](member_id, value)
+
+    def _group_changes(self, zone_id, member_ids):
+        """List the (member id, field, value) changes making members match zone_id.
+
+        Members are compared by the values they are headed for, so a
+        second report from the master before the member's echo arrives
+        does not send the same command again.
+        """
+        master = self.zones[zone_id]
+        changes = []
+        for member_id in member_ids:
+            member = self.zones[member_id]
+            wanted = {'power': master.power, 'volume': master.volume,
+                      'mute': master.mute, 'source': master.source}
+            if master.volume is not None and member.volume_offset:
+                volume = percent_to_db(db_to_percent(master.volume) + member.volume_offset)
+                wanted['volume'] = max(VOLUME_MIN, min(volume, VOLUME_MAX))
+            for field, value in wanted.items():
+                if value is not None and value != self._current(member_id, field):
+                    changes.append((member_id, field, value))
+        return changes
+
+    def _update_group_members(self):
+        """Derive group_members of every zone from the topology in one pass.
+
+        Returns the ids of the zones whose group_members changed.
+        """
+        changed = []
+        for zone_id, zone in self.zones.items():
+            group_members = None
+            if zone_id in self._media_players:
+                group_members = [self._media_players[zone_id]] + [
+                    self._media_players[member_id]
+                    for member_id in self.groups.members(zone_id)
+                    if member_id in self._media_players
+                ]
+            if group_members != zone.group_members:
+                zone.group_members = group_members
+                changed.append(zone_id)
+        return changed
+
+    @callback
+    def _async_set_virtual(self, zone_id, field, value):
+        """Set a field of zone 0, which only exists in software."""
+        if field in RAMP_FIELDS:
+            self._async_cancel_ramp(zone_id)
+        self._async_apply_virtual(zone_id, field, value)
+
+    @callback
+    def _async_apply_virtual(self, zone_id, field, value):
+        setattr(self.zones[zone_id], field, value)
+        self._async_notify(zone_id, (field,))
+        self._sync_group(zone_id)
+
+    @callback
+    def _async_send(self, zone_id, field, value):
+        """Queue a command setting a field of a zone."""
+        if field in RAMP_FIELDS:
+            self._async_cancel_ramp(zone_id)
+        return self._async_queue(zone_id, field, value)
+
+    @callback
+    def _async_queue(self, zone_id, field, value):
+        self._async_set_pending(zone_id, field, value)
+        self._commanded[(zone_id, field)] = value
+        return self.nuvo.send(_FORMATTERS[field](zone_id, value), (zone_id, field))
+
+    @callback
+    def _async_set_pending(self, zone_id, field, value):
+        zone = self.zones[zone_id]
+        key = (zone_id, field)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = [value, getattr(zone, field), None]
+        else:
+            pending[0] = value
+            pending[2].cancel()
+        pending[2] = self.hass.loop.call_later(
+            OPTIMISTIC_TIMEOUT, self._async_rollback, zone_id, field)
+        if self.optimistic and getattr(zone, field) != value:
+            setattr(zone, field, value)
+            self._async_notify(zone_id, (field,))
+
+    @callback
+    def _async_discard(self, keys):
+        """Drop queued commands for any of the (zone id, field) keys.
+
+        Optimistic values of the dropped commands are put back to what
+        the amp last reported, as those commands will never be sent.
+        Returns the keys that were dropped.
+        """
+        dropped = self.nuvo.discard(keys)
+        for key in dropped:
+            pending = self._pending.pop(key, None)
+            if pending is None:
+                continue
+            pending[2].cancel()
+            zone_id, field = key
+            if getattr(self.zones[zone_id], field) != pending[1]:
+                setattr(self.zones[zone_id], field, pending[1])
+                self._async_notify(zone_id, (field,))
+        return dropped
+
+    @callback
+    def _async_rollback(self, zone_id, field):
+        """Put back the last reported value of a command the amp did not confirm."""
+        value, reported, _ = self._pending.pop((zone_id, field))
+        _LOGGER.debug('Zone %s did not confirm %s %s, rolling back to %s',
+                      zone_id, field, value, reported)
+        if getattr(self.zones[zone_id], field) != reported:
+            setattr(self.zones[zone_id], field, reported)
+            self._async_notify(zone_id, (field,))
+        if self.optimistic:
+            self.async_request_refresh(zone_id)
+
+    # The async_set_* methods queue a command and return right away with
+    # the future from the connection, or None for zone 0.  Commands are
+    # keyed by zone and field so a newer value replaces a queued one.
+
+    @callback
+    def async_set_power(self, zone_id, power):
+        if zone_id == 0:
+            self._async_set_virtual(0, 'power', power)
+            return None
+        return self._async_send(zone_id, 'power', power)
+
+    @callback
+    def async_set_mute(self, zone_id, mute):
+        if zone_id == 0:
+            self._async_set_virtual(0, 'mute', mute)
+            return None
+        return self._async_send(zone_id, 'mute', mute)
+
+    @callback
+    def async_set_volume(self, zone_id, volume):
+        if zone_id == 0:
+            self._async_set_virtual(0, 'volume', volume)
+            return None
+        volume = max(VOLUME_MIN, min(int(volume), VOLUME_MAX))
+        return self._async_send(zone_id, 'volume', volume)
+
+    @callback
+    def async_step_volume(self, zone_id, step):
+        """Change the volume by step dB from the newest value, queued or reported."""
+        volume = self.zones[zone_id].volume
+        if self.nuvo.is_queued((zone_id, 'volume')):
+            volume = self._commanded[(zone_id, 'volume')]
+        if volume is None:
+            return None
+        return self.async_set_volume(zone_id, max(VOLUME_MIN, min(volume + step, VOLUME_MAX)))
+
+    @callback
+    def async_set_source(self, zone_id, source):
+        if zone_id == 0:
+            self._async_set_virtual(0, 'source', source)
+            return None
+        return self._async_send(zone_id, 'source', source)
+
+    @callback
+    def async_set_bass(self, zone_id, bass):
+        return self._async_send(zone_id, 'bass', int(bass))
+
+    @callback
+    def async_set_treble(self, zone_id, treble):
+        return self._async_send(zone_id, 'treble', int(treble))
+
+    @callback
+    def async_set_balance(self, zone_id, balance):
+        return self._async_send(zone_id, 'balance', int(balance))
+
+    @callback
+    def async_set_group(self, zone_id, group):
+        return self._async_send(zone_id, 'group', group)
+
+    @callback
+    def async_set_volume_reset(self, zone_id, volume_reset):
+        return self._async_send(zone_id, 'volume_reset', volume_reset)
+
+    @callback
+    def async_set_keypad_lock(self, zone_id, lock):
+        # The lock state can not be queried, so remember what was sent
+        self.zones[zone_id].keypad_lock = lock
+        self._async_notify(zone_id, ('keypad_lock',))
+        return self.nuvo.send(_FORMATTERS['keypad_lock'](zone_id, lock), (zone_id, 'keypad_lock'))
+
+    @callback
+    def async_set_volume_offset(self, zone_id, volume_offset):
+        """Set the volume offset used when the zone follows a speaker group."""
+        self.zones[zone_id].volume_offset = int(volume_offset)
+        self._async_notify(zone_id, ('volume_offset',))
+
+    async def async_join_players(self, zone_id, group_members):
+        """Make the media players in group_members follow zone_id.
+
+        A zone can only follow one group, and can not lead a group while
+        following another one.  The commands bringing the new members in
+        line with zone_id go out as one batch, overtaking older queued
+        commands for the members and stopping their volume ramps.
+        """
+        zone_ids = {entity_id: member_id
+                    for member_id, entity_id in self._media_players.items()}
+        joined = self.groups.join(zone_id, [zone_ids[entity_id] for entity_id in group_members
+                                            if entity_id in zone_ids])
+        _LOGGER.debug('Joined zones %s to controller zone %s.  All slave zones: %s',
+                      joined, zone_id, self.groups.members(zone_id))
+        for other_id in self._update_group_members():
+            self._async_notify(other_id, ('group_members',))
+        for member_id in joined:
+            self._async_cancel_ramp(member_id)
+        await self._async_send_changes(self._group_changes(zone_id, joined))
+
+    @callback
+    def async_unjoin_player(self, zone_id):
+        """Remove a zone from all speaker groups.
+
+        A zone without followers of its own is switched off as well.
+        """
+        _LOGGER.debug('Unjoin zone %s from all groups', zone_id)
+        if not self.groups.members(zone_id):
+            self.async_set_power(zone_id, False)
+        self.groups.leave(zone_id)
+        for other_id in self._update_group_members():
+            self._async_notify(other_id, ('group_members',))
+
+    @callback
+    def async_ramp_volume(self, zone_id, volume, duration, curve='linear'):
+        """Ramp the volume of a zone to volume dB over duration seconds.
+
+        A ramp already running on the zone is replaced.  The ramp stops
+        when the zone is sent another volume, mute or power command, or
+        its volume changes at the keypad.  Returns the number of volume
+        commands planned.
+        """
+        self._async_cancel_ramp(zone_id)
+        volume = max(VOLUME_MIN, min(int(volume), VOLUME_MAX))
+        start = self.zones[zone_id].volume
+        if start is None:
+            plan = [(0.0, volume)]
+        else:
+            plan = plan_ramp(start, volume, duration, curve)
+        if plan:
+            _LOGGER.debug('Zone %s ramping from %s to %s dB in %d steps over %s s',
+                          zone_id, start, volume, len(plan), duration)
+            self._ramps[zone_id] = self.hass.async_create_task(
+                self._async_run_ramp(zone_id, plan))
+        return len(plan)
+
+    @callback
+    def _async_cancel_ramp(self, zone_id):
+        task = self._ramps.pop(zone_id, None)
+        if task is not None:
+            _LOGGER.debug('Zone %s volume ramp stopped', zone_id)
+            task.cancel()
+
+    async def _async_run_ramp(self, zone_id, plan):
+        loop = self.hass.loop
+        started = loop.time()
+        zone = self.zones[zone_id]
+        # Volumes this ramp has set, anything else was set at a keypad
+        expected = {zone.volume}
+        try:
+            for at, volume in plan:
+                await asyncio.sleep(started + at - loop.time())
+                if zone.volume not in expected:
+                    _LOGGER.debug('Zone %s volume changed to %s during a ramp, stopping it',
+                                  zone_id, zone.volume)
+                    return
+                expected.add(volume)
+                if zone_id == 0:
+                    self._async_apply_virtual(0, 'volume', volume)
+                else:
+                    self._async_queue(zone_id, 'volume', volume)
+        finally:
+            if self._ramps.get(zone_id) is asyncio.current_task():
+                del self._ramps[zone_id]
+
+    async def async_send_batch(self, changes, priority=PRIORITY_USER):
+        """Send a list of (zone_id, field, value) changes as one batch.
+
+        Changes are sent in the order given, except that zones being
+        powered on go first so the rest of the batch does not have to
+        wait for each of them.  Changes to zone 0 are applied in software.
+        Returns once the amp has answered every command, or timed out.
+        """
+        power_on = []
+        rest = []
+        for zone_id, field, value in changes:
+            if zone_id == 0:
+                self._async_set_virtual(0, field, value)
+            elif field == 'power' and value:
+                power_on.append(_FORMATTERS[field](zone_id, value))
+            else:
+                rest.append(_FORMATTERS[field](zone_id, value))
+        if power_on or rest:
+            await self.nuvo.async_send_batch(power_on + rest, priority)
+
+    def setup_paging(self, page_source, page_zones, page_volume):
+        """Precompute the paging frames so paging on only has to pick them.
+
+        page_volume holds the paging volume of each zone in page_zones,
+        in percent.
+        """
+        self._page_source = page_source
+        self._page_volume = dict(zip(page_zones, page_volume))
+        self._page_frames = [
+            (zone_id,
+             format_set_power(zone_id, True),
+             format_set_source(zone_id, page_source),
+             format_set_volume(zone_id, percent_to_db(int(volume))))
+            for zone_id, volume in self._page_volume.items()
+        ]
+
+    async def async_page_on(self, volume_offset=0):
+        """Switch the paging zones to the paging source and volume.
+
+        The state to restore is taken from the snapshot, which the amp
+        keeps current, so nothing is read before the zones are switched.
+        Returns the time in seconds until the amp answered every command,
+        or None if paging was already active.
+        """
+        if self._page_saved is not None:
+            _LOGGER.info('Paging already active, ignoring second request.')
+            return None
+        if not self.available:
+            _LOGGER.warning('Nuvo link is down, not paging.')
+            return None
+        start = time.perf_counter()
+        for zone_id, *_ in self._page_frames:
+            self._async_cancel_ramp(zone_id)
+        # Paging overtakes queued commands, which would then undo it, so
+        # drop those for the paging zones and restore them after paging
+        dropped = set(self._async_discard({(zone_id, field) for zone_id, *_ in self._page_frames
+                                           for field in PAGE_FIELDS}))
+        self._page_saved = {}
+        power_on = []
+        rest = []
+        for zone_id, power_frame, source_frame, volume_frame in self._page_frames:
+            zone = self.zones[zone_id]
+            self._page_saved[zone_id] = tuple(
+                self._commanded[(zone_id, field)] if (zone_id, field) in dropped
+                else getattr(zone, field)
+                for field in PAGE_FIELDS)
+            if not zone.power:
+                power_on.append(power_frame)
+            if zone.source != self._page_source:
+                rest.append(source_frame)
+            if volume_offset:
+                volume = min(100, max(0, self._page_volume[zone_id] + volume_offset))
+                volume_frame = format_set_volume(zone_id, percent_to_db(volume))
+            rest.append(volume_frame)
+        await self.nuvo.async_send_batch(power_on + rest, PRIORITY_URGENT)
+        self.page_on_latency = time.perf_counter() - start
+        _LOGGER.info('Paging on took %.0f ms', self.page_on_latency * 1000)
+        return self.page_on_latency
+
+    async def async_page_off(self):
+        """Restore the paging zones to their state before paging.
+
+        Only the fields that differ from the current snapshot are sent.
+        Returns the time in seconds until the amp answered every command,
+        or None if paging was not active.
+        """
+        if self._page_saved is None:
+            _LOGGER.info('Paging is not active, nothing to restore.')
+            return None
+        if not self.available:
+            # Keep what to restore for when the link is back
+            _LOGGER.warning('Nuvo link is down, paging stays active.')
+            return None
+        start = time.perf_counter()
+        saved, self._page_saved = self._page_saved, None
+        changes = []
+        for zone_id, (power, source, volume, mute) in saved.items():
+            zone = self.zones.get(zone_id)
+            if zone is None:
+                continue
+            if volume is not None and volume != zone.volume:
+                changes.append((zone_id, 'volume', volume))
+            if mute is not None and mute != zone.mute:
+                changes.append((zone_id, 'mute', mute))
+            if power is False:
+                if zone.power is not False:
+                    changes.append((zone_id, 'power', False))
+            elif source is not None and source != zone.source:
+                changes.append((zone_id, 'source', source))
+        await self.async_send_batch(changes, PRIORITY_URGENT)
+        self.page_off_latency = time.perf_counter() - start
+        _LOGGER.info('Paging off took %.0f ms', self.page_off_latency * 1000)
+        return self.page_off_latency
+
+    def _current(self, zone_id, field):
+        """Value a field of a zone is at, or will be once commands on their way arrive."""
+        pending = self._pending.get((zone_id, field))
+        if pending is not None:
+            return pending[0]
+        if self.nuvo.is_queued((zone_id, field)):
+            return self._commanded.get((zone_id, field), getattr(self.zones[zone_id], field))
+        return getattr(self.zones[zone_id], field)
+
+    async def _async_send_changes(self, changes):
+        """Send (zone id, field, value) changes as one batch.
+
+        Queued commands for the same fields are dropped, as they would
+        undo the batch once it is answered, the changes are kept as
+        pending like single commands, and volume offsets are set in
+        software.  Returns the number of commands sent.
+        """
+        keys = {(zone_id, field) for zone_id, field, _ in changes}
+        for zone_id in {zone_id for zone_id, field in keys if field in RAMP_FIELDS}:
+            self._async_cancel_ramp(zone_id)
+        self._async_discard(keys)
+        batch = []
+        for zone_id, field, value in changes:
+            if field == 'volume_offset':
+                self.async_set_volume_offset(zone_id, value)
+                continue
+            if zone_id:
+                self._async_set_pending(zone_id, field, value)
+                self._commanded[(zone_id, field)] = value
+            batch.append((zone_id, field, value))
+        await self.async_send_batch(batch)
+        return len(batch)
+
+    @callback
+    def async_snapshot(self, name):
+        """Save the state of every zone and the speaker groups under a name.
+
+        Taken from the snapshot the amp keeps current, so nothing is read.
+        Values still on their way to the amp are saved as commanded.
+        """
+        zones = {zone_id: {field: self._current(zone_id, field) for field in SNAPSHOT_FIELDS}
+                 for zone_id in self.zones}
+        self._snapshots[name] = (zones, self.groups.as_dict())
+        _LOGGER.info('Saved snapshot "%s" of %d zones', name, len(zones) - 1)
+
+    def _state_changes(self, states, fields):
+        """List the (zone id, field, value) changes that bring zones to states.
+
+        states maps zone ids to the values wanted for some of fields.
+        Fields already at the value are left out, and so are the source,
+        volume and mute of zones that end up off.  Changes are listed
+        field by field, in the order of fields.
+        """
+        changes = []
+        for field in fields:
+            for zone_id, values in states.items():
+                value = values.get(field)
+                if zone_id not in self.zones or value is None:
+                    continue
+                if value == self._current(zone_id, field):
+                    continue
+                if (field in ('source', 'volume', 'mute')
+                        and not values.get('power', self._current(zone_id, 'power'))):
+                    continue
+                changes.append((zone_id, field, value))
+        return changes
+
+    async def async_restore(self, name):
+        """Bring every zone and the speaker groups back to a snapshot.
+
+        Only the fields that differ from the current state are sent, as
+        one batch.  Returns the time in seconds until the amp answered
+        every command, or None if there is no such snapshot or the link
+        is down.
+        """
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            _LOGGER.error('No Nuvo snapshot named "%s" to restore.', name)
+            return None
+        if not self.available:
+            _LOGGER.warning('Nuvo link is down, not restoring "%s".', name)
+            return None
+        start = time.perf_counter()
+        saved, groups = snapshot
+        for zone_id in saved:
+            self._async_cancel_ramp(zone_id)
+        if groups != self.groups.as_dict():
+            self.groups.restore(groups)
+            for zone_id in self._update_group_members():
+                self._async_notify(zone_id, ('group_members',))
+        sent = await self._async_send_changes(self._state_changes(saved, SNAPSHOT_FIELDS))
+        latency = time.perf_counter() - start
+        _LOGGER.info('Restoring "%s" took %.0f ms for %d commands', name, latency * 1000, sent)
+        return latency
+
+    async def async_apply_state(self, states):
+        """Bring zones to the values in states as one batch.
+
+        states maps zone ids to field -> value, in the units of the
+        snapshot, for any of APPLY_FIELDS.  Fields already at the value
+        are not sent.  Returns the time in seconds until the amp answered
+        every command, or None if the link is down.
+        """
+        if not self.available:
+            _LOGGER.warning('Nuvo link is down, not applying state.')
+            return None
+        start = time.perf_counter()
+        sent = await self._async_send_changes(self._state_changes(states, APPLY_FIELDS))
+        latency = time.perf_counter() - start
+        _LOGGER.info('Applying state took %.0f ms for %d commands', latency * 1000, sent)
+        return latency
+
+    async def async_mute_all(self):
+        self._async_discard({(zone_id, 'mute') for zone_id in self.zones})
+        if not await self.nuvo.send(format_mute_all(), priority=PRIORITY_URGENT):
+            return
+        for zone_id, zone in self.zones.items():
+            if zone_id:
+                zone.mute = True
+                self._async_notify(zone_id, ('mute',))
+
+    async def async_unmute_all(self):
+        self._async_discard({(zone_id, 'mute') for zone_id in self.zones})
+        if not await self.nuvo.send(format_unmute_all(), priority=PRIORITY_URGENT):
+            return
+        for zone_id, zone in self.zones.items():
+            if zone_id:
+                zone.mute = False
+                self._async_notify(zone_id, ('mute',))
+
+    async def async_all_off(self):
+        for zone_id in list(self._ramps):
+            self._async_cancel_ramp(zone_id)
+        self._async_discard({(zone_id, 'power') for zone_id in self.zones})
+        if not await self.nuvo.send(format_all_off(), priority=PRIORITY_URGENT):
+            return
+        self._all_off_zones = set()
+        for zone_id, zone in self.zones.items():
+            zone.power = False
+            self._async_notify(zone_id, ('power',))
@@ -0,0 +1,46 @@
+"""Diagnostics support for Nuvo Classic."""
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from . import DOMAIN, MODEL
+from .coordinator import STORED_FIELDS
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return the zone snapshot and link measurements of a config entry."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    nuvo = data['nuvo']
+    coordinator = data['coordinator']
+    return {
+        'config': {**entry.data, **entry.options},
+        'model': data[MODEL],
+        'zones': {
+            zone_id: {
+                **{field: getattr(zone, field) for field in STORED_FIELDS},
+                'stale': sorted(zone.stale),
+            }
+            for zone_id, zone in coordinator.zones.items()
+        },
+        'connection': {
+            'port': nuvo.port_url,
+            'baud': nuvo.baud,
+            'health': nuvo.health,
+            'queue_depth': nuvo.queue_depth,
+            'inflight': nuvo.inflight,
+            'pacing': nuvo.pacing,
+            # Nothing runs in executor jobs, the link lives on the event loop
+            'loop_time_ms': _ms(nuvo.busy_time),
+            'loop_time_max_ms': _ms(nuvo.busy_time_max),
+        },
+        'timing': {
+            'prefetch_ms': _ms(coordinator.prefetch_time),
+            'page_on_ms': _ms(coordinator.page_on_latency),
+            'page_off_ms': _ms(coordinator.page_off_latency),
+        },
+        # None unless "Collect Link Statistics" is enabled
+        'statistics': nuvo.stats.as_dict() if nuvo.stats is not None else None,
+    }
@@ -18,14 +18,18 @@ from homeassistant.util import dt as dt_util
 
 from . import (
     DOMAIN as COMPONENT_DOMAIN,
-    DATA_NUVO,
+    async_add_zone_entities,
+    legacy_entry_data,
     CONF_SOURCES,
     CONF_ZONES,
+    SERVICE_RAMP_VOLUME,
     SOURCE_SCHEMA,
     ZONE_SCHEMA,
     SOURCE_IDS,
     ZONE_IDS
 )
+from .protocol import VOLUME_LEVELS, VOLUME_MAX, VOLUME_MIN, level_to_db
+from .ramp import CURVES
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -37,6 +41,16 @@ SUPPORT_NUVO = MediaPlayerEntityFeature.VOLUME_MUTE | \
                     MediaPlayerEntityFeature.SELECT_SOURCE | \
                     MediaPlayerEntityFeature.GROUPING
 
+ATTR_DURATION = 'duration'
+ATTR_CURVE = 'curve'
+MAX_RAMP_DURATION = 3600
+
+RAMP_VOLUME_SCHEMA = {
+    vol.Required('volume_level'): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+    vol.Required(ATTR_DURATION): vol.All(vol.Coerce(float), vol.Range(min=0, max=MAX_RAMP_DURATION)),
+    vol.Optional(ATTR_CURVE, default='linear'): vol.In(list(CURVES)),
+}
+
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Required(CONF_PORT): cv.string,
     vol.Required(CONF_ZONES): vol.Schema({ZONE_IDS: ZONE_SCHEMA}),
@@ -45,40 +59,42 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up Nuvo media player entities from a config entry."""
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    sources = hass.data[COMPONENT_DOMAIN][CONF_SOURCES]
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    entities = [NuvoZone(hass, nuvo, sources, 0, 'Group Controller')]
-    for zone_id, extra in zones.items():
-        _LOGGER.info("Adding media player zone %d - %s", zone_id, extra[CONF_NAME])
-        entities.append(NuvoZone(hass, nuvo, sources, zone_id, extra[CONF_NAME]))
-    async_add_entities(entities, True)
+    data = hass.data[COMPONENT_DOMAIN][entry.entry_id]
+    coordinator = data['coordinator']
+    group_controller = NuvoZone(hass, coordinator, data[CONF_SOURCES], 0, 'Group Controller')
+    data['entities'][0] = [group_controller]
+    async_add_entities([group_controller])
+
+    def zone_entities(zone_id, zone_name):
+        _LOGGER.info("Adding media player zone %d - %s", zone_id, zone_name)
+        return [NuvoZone(hass, coordinator, data[CONF_SOURCES], zone_id, zone_name)]
+
+    async_add_zone_entities(hass, entry, async_add_entities, zone_entities)
+
+    entity_platform.async_get_current_platform().async_register_entity_service(
+        SERVICE_RAMP_VOLUME, RAMP_VOLUME_SCHEMA, 'async_ramp_volume')
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    sources = hass.data[COMPONENT_DOMAIN][CONF_SOURCES]
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    hass.data[DATA_NUVO][DOMAIN] = []
-    hass.data[DATA_NUVO][DOMAIN].append(NuvoZone(hass, nuvo, sources, 0, 'Group Controller'))
+    data = legacy_entry_data(hass)
+    coordinator = data['coordinator']
+    sources = data[CONF_SOURCES]
+    zones = data[CONF_ZONES]
+    entities = [NuvoZone(hass, coordinator, sources, 0, 'Group Controller')]
 
     for zone_id, extra in zones.items():
         _LOGGER.info("Adding media player zone %d - %s", zone_id, extra[CONF_NAME])
-        hass.data[DATA_NUVO][DOMAIN].append(NuvoZone(hass, nuvo, sources, zone_id, extra[CONF_NAME]))
+        entities.append(NuvoZone(hass, coordinator, sources, zone_id, extra[CONF_NAME]))
 
-    async_add_entities(hass.data[DATA_NUVO][DOMAIN], True)
+    async_add_entities(entities)
 
 class NuvoZone(MediaPlayerEntity):
     """Representation of a Nuvo amplifier zone."""
 
-    def __init__(self, hass: HomeAssistant, nuvo, sources, zone_id, zone_name):
+    def __init__(self, hass: HomeAssistant, coordinator, sources, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
-        self._source_id_name = sources
-        self._source_name_id = {v: k for k, v in sources.items()}
-        # ordered list of all source names
-        self._source_names = sorted(self._source_name_id.keys(),
-                                    key=lambda v: self._source_name_id[v])
+        self._coordinator = coordinator
+        self._set_sources(sources)
         self._zone_id = zone_id
         self._name = zone_name
 
@@ -86,17 +102,24 @@ class NuvoZone(MediaPlayerEntity):
         self._volume = None
         self._source = None
         self._mute = None
+        self._group_members = None
+        self._stale = set()
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zone_status(self._zone_id)
-        if not state:
-            return False
+    def _set_sources(self, sources):
+        self._source_id_name = sources
+        self._source_name_id = {v: k for k, v in sources.items()}
+        # ordered list of all source names
+        self._source_names = sorted(self._source_name_id.keys(),
+                                    key=lambda v: self._source_name_id[v])
+
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        state = self._coordinator.zones[self._zone_id]
+        self._stale = state.stale & {'power', 'source', 'volume', 'mute'}
+        if state.power is None:
+            return
         self._state = STATE_ON if state.power else STATE_OFF
-        if state.zonegroup_members != []:
-            self._group_members = state.zonegroup_members
-        else:
-            self._group_members = None
+        self._group_members = state.group_members
         self._volume = state.volume
         self._mute = state.mute
         try:
@@ -105,27 +128,41 @@ class NuvoZone(MediaPlayerEntity):
             self._source = 'Unknown'
 
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self.entity_id, 'media')
-        self.update()
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('power', 'source', 'volume', 'mute', 'group_members')))
+        self._coordinator.register_media_player(self._zone_id, self.entity_id)
+        self._update_from_coordinator()
 
-    def join_players(self, group_members: list[str]):
+    async def async_join_players(self, group_members: list[str]) -> None:
         _LOGGER.debug('Zone %s adding %s to group', self._zone_id, group_members)
-        self._nuvo.join_players(self._zone_id, group_members)
+        await self._coordinator.async_join_players(self._zone_id, group_members)
 
-    def unjoin_player(self) -> None:
+    async def async_unjoin_player(self) -> None:
         _LOGGER.debug('Zone %s unjoin from all groups', self._zone_id)
-        self._nuvo.unjoin_player(self._zone_id)
-        return True
+        self._coordinator.async_unjoin_player(self._zone_id)
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s media player update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
+
+    @callback
+    def async_update_options(self, data):
+        """Pick up new zone and source names from the options."""
+        sources = data[CONF_SOURCES]
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME] if self._zone_id else self._name
+        if sources == self._source_id_name and zone_name == self._name:
+            return
+        self._name = zone_name
+        self._set_sources(sources)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
 
     @property
     def unique_id(self):
         """Return a unique ID for this zone."""
-        return f"nuvo_simple_zone_{self._zone_id}"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}"
 
     @property
     def name(self):
@@ -137,6 +174,11 @@ class NuvoZone(MediaPlayerEntity):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def device_class(self):
         """Return the type of the device."""
@@ -162,10 +204,8 @@ class NuvoZone(MediaPlayerEntity):
         """Volume level of the media player (0..1)."""
         if self._volume is None:
             return None
-        if int(self._volume) > -24:
-            return (( int(self._volume) + 24) / 24 / 2 +.5)
-        else:
-            return (( int(self._volume) + 78) / 54 / 2)
+        volume = max(VOLUME_MIN, min(int(self._volume), VOLUME_MAX))
+        return VOLUME_LEVELS[volume - VOLUME_MIN]
 
     @property
     def is_volume_muted(self):
@@ -182,49 +222,43 @@ class NuvoZone(MediaPlayerEntity):
         """Return flag of media commands that are supported."""
         return SUPPORT_NUVO
 
-    def page (self, page_source, page_zones, page_volume):
-        """Call paging service."""
-        self._nuvo.page(page_source, page_zones, page_volume)
-
-    def restore(self, page_source, page_zones):
-        """Restore saved state."""
-        self._nuvo.restore(page_source, page_zones)
+    @property
+    def extra_state_attributes(self):
+        """List the values from the last run the amp has not confirmed yet."""
+        return {'stale': sorted(self._stale)}
 
-    def select_source(self, source):
+    async def async_select_source(self, source):
         """Set input source."""
         if source not in self._source_name_id:
             return
         idx = self._source_name_id[source]
-        self._nuvo.set_source(self._zone_id, idx)
+        self._coordinator.async_set_source(self._zone_id, idx)
 
-    def turn_on(self):
+    async def async_turn_on(self):
         """Turn the media player on."""
-        self._nuvo.set_power(self._zone_id, True)
+        self._coordinator.async_set_power(self._zone_id, True)
 
-    def turn_off(self):
+    async def async_turn_off(self):
         """Turn the media player off."""
-        self._nuvo.set_power(self._zone_id, False)
+        self._coordinator.async_set_power(self._zone_id, False)
 
-    def mute_volume(self, mute):
+    async def async_mute_volume(self, mute):
         """Mute (true) or unmute (false) media player."""
-        self._nuvo.set_mute(self._zone_id, mute)
+        self._coordinator.async_set_mute(self._zone_id, mute)
 
-    def set_volume_level(self, volume):
+    async def async_set_volume_level(self, volume):
         """Set volume level, range 0..1."""
-        if volume > .5:
-            self._nuvo.set_volume(self._zone_id, int((volume * 48) - 48))
-        else:
-            self._nuvo.set_volume(self._zone_id, int((volume * 108) - 78))
+        self._coordinator.async_set_volume(self._zone_id, level_to_db(volume))
 
-    def volume_up(self):
+    async def async_ramp_volume(self, volume_level, duration, curve='linear'):
+        """Ramp the volume to volume_level over duration seconds."""
+        self._coordinator.async_ramp_volume(self._zone_id, level_to_db(volume_level),
+                                            duration, curve)
+
+    async def async_volume_up(self):
         """Volume up the media player."""
-        if self._volume is None:
-            return
-        self._nuvo.set_volume(self._zone_id, min(self._volume + 1, 0))
+        self._coordinator.async_step_volume(self._zone_id, 1)
 
-    def volume_down(self):
+    async def async_volume_down(self):
         """Volume down media player."""
-        if self._volume is None:
-            return
-        self._nuvo.set_volume(self._zone_id, max(self._volume - 1, -78))
-
+        self._coordinator.async_step_volume(self._zone_id, -1)
@@ -0,0 +1,99 @@
+"""Serial link metrics for Prometheus, in its text exposition format."""
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.core import HomeAssistant
+
+from . import CONF_METRICS, DOMAIN
+from .connection import HEALTH_CONNECTED
+
+METRICS_URL = f'/api/{DOMAIN}/metrics'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_metrics(amps):
+    """Render the metrics of every amp.
+
+    :param amps: list of (amp name, entry id, NuvoConnection) for the
+                 amps publishing metrics
+    :return: the text Prometheus scrapes
+    """
+    families = {
+        'commands_sent_total': ('counter', 'Requests written to the amp', []),
+        'replies_total': ('counter', 'Requests the amp answered', []),
+        'timeouts_total': ('counter', 'Requests the amp did not answer in time', []),
+        'round_trip_avg_seconds': ('gauge', 'Average time from request to reply', []),
+        'round_trip_max_seconds': ('gauge', 'Longest time from request to reply', []),
+        'reconnects_total': ('counter', 'Times the link was reopened after an error', []),
+        'errors_total': ('counter', 'Error and busy replies', []),
+        'bytes_sent_total': ('counter', 'Bytes written to the amp', []),
+        'bytes_received_total': ('counter', 'Bytes received from the amp', []),
+        'link_up': ('gauge', '1 while the link is open and the amp answering', []),
+        'queue_length': ('gauge', 'Requests waiting to be written', []),
+        'inflight': ('gauge', 'Requests written and waiting for a reply', []),
+    }
+
+    def add(name, value, **labels):
+        families[name][2].append(f'{DOMAIN}_{name}{_labels(**labels)} {value}')
+
+    for amp, entry_id, nuvo in amps:
+        stats = nuvo.stats
+        add('link_up', int(nuvo.health == HEALTH_CONNECTED), amp=amp, entry_id=entry_id)
+        add('queue_length', nuvo.queue_depth, amp=amp, entry_id=entry_id)
+        add('inflight', nuvo.inflight, amp=amp, entry_id=entry_id)
+        if stats is None:
+            continue
+        add('reconnects_total', stats.reconnects, amp=amp, entry_id=entry_id)
+        add('errors_total', stats.errors + stats.busy, amp=amp, entry_id=entry_id)
+        add('bytes_sent_total', stats.bytes_out, amp=amp, entry_id=entry_id)
+        add('bytes_received_total', stats.bytes_in, amp=amp, entry_id=entry_id)
+        for zone, counters in sorted(stats.zones.items(), key=lambda item: str(item[0])):
+            labels = {'amp': amp, 'entry_id': entry_id, 'zone': zone}
+            add('commands_sent_total', counters.sent, **labels)
+            add('replies_total', counters.replies, **labels)
+            add('timeouts_total', counters.timeouts, **labels)
+            if counters.replies:
+                add('round_trip_avg_seconds',
+                    round(counters.round_trip_sum / counters.replies, 6), **labels)
+                add('round_trip_max_seconds', round(counters.round_trip_max, 6), **labels)
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f'# HELP {DOMAIN}_{name} {help_text}')
+        lines.append(f'# TYPE {DOMAIN}_{name} {kind}')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+class NuvoMetricsView(HomeAssistantView):
+    """Serve the metrics of the amps that have "Publish Link Metrics" enabled.
+
+    Needs a long-lived access token like the rest of the API.
+    """
+
+    url = METRICS_URL
+    name = f'api:{DOMAIN}:metrics'
+    requires_auth = True
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+
+    async def get(self, request):
+        amps = []
+        for entry_id, data in self.hass.data.get(DOMAIN, {}).items():
+            if not data['conf'].get(CONF_METRICS, False):
+                continue
+            entry = self.hass.config_entries.async_get_entry(entry_id)
+            amps.append((entry.title if entry else entry_id, entry_id, data['nuvo']))
+        if not amps:
+            return web.Response(status=404)
+        return web.Response(body=format_metrics(amps).encode(),
+                            headers={'Content-Type': CONTENT_TYPE})
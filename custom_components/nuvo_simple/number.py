@@ -14,7 +14,8 @@ from homeassistant.util import dt as dt_util
 from . import (
     DOMAIN as COMPONENT_DOMAIN,
     MODEL,
-    DATA_NUVO,
+    async_add_zone_entities,
+    legacy_entry_data,
     ZONE_SCHEMA,
     CONF_ZONES,
     ZONE_IDS,
@@ -27,20 +28,23 @@ DOMAIN = 'number'
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up Nuvo number entities from a config entry."""
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    min_offset = int(hass.data[COMPONENT_DOMAIN][CONF_MIN_OFFSET])
-    max_offset = int(hass.data[COMPONENT_DOMAIN][CONF_MAX_OFFSET])
-    model = hass.data[COMPONENT_DOMAIN][MODEL]
-    entities = []
-    for zone_id, extra in zones.items():
-        _LOGGER.info("Adding number entities for zone %d - %s", zone_id, extra[CONF_NAME])
-        entities.append(NuvoBass(nuvo, zone_id, extra[CONF_NAME]))
-        entities.append(NuvoTreble(nuvo, zone_id, extra[CONF_NAME]))
-        entities.append(NuvoVolumeOffset(nuvo, zone_id, extra[CONF_NAME], min_offset, max_offset))
+    data = hass.data[COMPONENT_DOMAIN][entry.entry_id]
+    coordinator = data['coordinator']
+    model = data[MODEL]
+
+    def zone_entities(zone_id, zone_name):
+        _LOGGER.info("Adding number entities for zone %d - %s", zone_id, zone_name)
+        entities = [
+            NuvoBass(coordinator, zone_id, zone_name),
+            NuvoTreble(coordinator, zone_id, zone_name),
+            NuvoVolumeOffset(coordinator, zone_id, zone_name,
+                             int(data[CONF_MIN_OFFSET]), int(data[CONF_MAX_OFFSET])),
+        ]
         if model == 'CONCERTO':
-            entities.append(NuvoBalance(nuvo, zone_id, extra[CONF_NAME]))
-    async_add_entities(entities, True)
+            entities.append(NuvoBalance(coordinator, zone_id, zone_name))
+        return entities
+
+    async_add_zone_entities(hass, entry, async_add_entities, zone_entities)
 
 
 async def async_setup_platform(
@@ -48,58 +52,79 @@ async def async_setup_platform(
     config: ConfigType,
     async_add_entities: AddEntitiesCallback,
     discovery_info: None) -> None:
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    min_offset = int(hass.data[COMPONENT_DOMAIN][CONF_MIN_OFFSET])
-    max_offset = int(hass.data[COMPONENT_DOMAIN][CONF_MAX_OFFSET])
-    hass.data[DATA_NUVO][DOMAIN] = []
+    data = legacy_entry_data(hass)
+    coordinator = data['coordinator']
+    zones = data[CONF_ZONES]
+    min_offset = int(data[CONF_MIN_OFFSET])
+    max_offset = int(data[CONF_MAX_OFFSET])
+    entities = []
 
     for zone_id, extra in zones.items():
         _LOGGER.info("Adding number entities for zone %d - %s", zone_id, extra[CONF_NAME])
-        hass.data[DATA_NUVO][DOMAIN].append(NuvoBass(nuvo, zone_id, extra[CONF_NAME]))
-        hass.data[DATA_NUVO][DOMAIN].append(NuvoTreble(nuvo, zone_id, extra[CONF_NAME]))
-        hass.data[DATA_NUVO][DOMAIN].append(NuvoVolumeOffset(nuvo, zone_id, extra[CONF_NAME], min_offset, max_offset))
-        if hass.data[DATA_NUVO][MODEL] == 'CONCERTO':
-            hass.data[DATA_NUVO][DOMAIN].append(NuvoBalance(nuvo, zone_id, extra[CONF_NAME]))
+        entities.append(NuvoBass(coordinator, zone_id, extra[CONF_NAME]))
+        entities.append(NuvoTreble(coordinator, zone_id, extra[CONF_NAME]))
+        entities.append(NuvoVolumeOffset(coordinator, zone_id, extra[CONF_NAME], min_offset, max_offset))
+        if data[MODEL] == 'CONCERTO':
+            entities.append(NuvoBalance(coordinator, zone_id, extra[CONF_NAME]))
 
-    async_add_entities(hass.data[DATA_NUVO][DOMAIN], True)
+    async_add_entities(entities)
 
 class NuvoBass(NumberEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name):
+    def __init__(self, coordinator, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
 
         self._bass = None
+        self._stale = False
 
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
-        self.update()
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('bass',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (bass) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
+
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        zone = self._coordinator.zones[self._zone_id]
+        self._bass = zone.bass
+        self._stale = 'bass' in zone.stale
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            return False
-        self._bass = state.bass
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        if zone_name != self._name:
+            self._name = zone_name
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_bass"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_bass"
+
+    @property
+    def extra_state_attributes(self):
+        """Flag a value from the last run the amp has not confirmed yet."""
+        return {'stale': self._stale}
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def name(self):
         """Return the name of the zone."""
@@ -124,43 +149,64 @@ class NuvoBass(NumberEntity):
 
     async def async_set_native_value(self, value: float) -> None:
         """Set new value."""
-        self._nuvo.set_bass(self._zone_id, value)
+        self._coordinator.async_set_bass(self._zone_id, value)
 
 class NuvoTreble(NumberEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name):
+    def __init__(self, coordinator, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
 
         self._treble = None
+        self._stale = False
 
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('treble',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (treble) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            return False
-        self._treble = state.treble
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        zone = self._coordinator.zones[self._zone_id]
+        self._treble = zone.treble
+        self._stale = 'treble' in zone.stale
+
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        if zone_name != self._name:
+            self._name = zone_name
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_treble"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_treble"
+
+    @property
+    def extra_state_attributes(self):
+        """Flag a value from the last run the amp has not confirmed yet."""
+        return {'stale': self._stale}
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def name(self):
         """Return the name of the zone."""
@@ -185,14 +231,14 @@ class NuvoTreble(NumberEntity):
 
     async def async_set_native_value(self, value: float) -> None:
         """Set new value."""
-        self._nuvo.set_treble(self._zone_id, value)
+        self._coordinator.async_set_treble(self._zone_id, value)
 
 class NuvoVolumeOffset(NumberEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name, min_offset, max_offset):
+    def __init__(self, coordinator, zone_id, zone_name, min_offset, max_offset):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
         self._min_offset = min_offset
@@ -201,29 +247,46 @@ class NuvoVolumeOffset(NumberEntity):
         self._volume_offset = None
 
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('volume_offset',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (volume offset) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            return False
-        self._volume_offset = state.volume_offset
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        self._volume_offset = self._coordinator.zones[self._zone_id].volume_offset
+
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name and offset range from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        min_offset = int(data[CONF_MIN_OFFSET])
+        max_offset = int(data[CONF_MAX_OFFSET])
+        if (zone_name, min_offset, max_offset) != (self._name, self._min_offset, self._max_offset):
+            self._name = zone_name
+            self._min_offset = min_offset
+            self._max_offset = max_offset
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_volume_offset"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_volume_offset"
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def name(self):
         """Return the name of the zone."""
@@ -248,44 +311,64 @@ class NuvoVolumeOffset(NumberEntity):
 
     async def async_set_native_value(self, value: float) -> None:
         """Set new value."""
-        self._nuvo.set_volume_offset(self._zone_id, value)
+        self._coordinator.async_set_volume_offset(self._zone_id, value)
 
 class NuvoBalance(NumberEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name):
+    def __init__(self, coordinator, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
 
         self._balance = None
+        self._stale = False
 
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
-        self.update()
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('balance',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (balance) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            return False
-        self._balance = state.balance
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        zone = self._coordinator.zones[self._zone_id]
+        self._balance = zone.balance
+        self._stale = 'balance' in zone.stale
+
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        if zone_name != self._name:
+            self._name = zone_name
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_balance"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_balance"
+
+    @property
+    def extra_state_attributes(self):
+        """Flag a value from the last run the amp has not confirmed yet."""
+        return {'stale': self._stale}
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def name(self):
         """Return the name of the zone."""
@@ -311,4 +394,4 @@ class NuvoBalance(NumberEntity):
     async def async_set_native_value(self, value: float) -> None:
         """Set new value."""
         _LOGGER.debug('Zone %s set balance %s', self._zone_id, value)
-        self._nuvo.set_balance(self._zone_id, value)
+        self._coordinator.async_set_balance(self._zone_id, value)
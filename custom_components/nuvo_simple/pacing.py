@@ -0,0 +1,132 @@
+"""Adaptive pacing of the requests written to a Nuvo amplifier.
+
+The amp handles one request at a time and drops, or answers ``#Busy``
+to, requests that arrive while it is still busy with an earlier one.
+How long it needs differs per command and per firmware, so instead of
+waiting a fixed time after every request the pacer learns it from the
+replies: the time between the amp being able to start on a request and
+its reply starting to arrive is the processing time of that command.
+
+The pacer then times requests so that each one has arrived completely
+once the amp is done with the previous one, or once its reply is out
+if that takes longer, and lets up to ``window`` requests wait for their
+replies at once.  The window grows while the amp keeps answering and is
+halved, and the spacing doubled, whenever a request times out or the
+amp answers busy or with something that can not be parsed.
+"""
+from .stats import command_type, request_zone
+
+BITS_PER_BYTE = 10          # Start, 8 data and stop bit
+INITIAL_PROCESS_TIME = 0.05  # Seconds assumed for a command type until it has been answered
+INITIAL_REPLY_BYTES = 30    # Reply length assumed until one has been seen
+MAX_PROCESS_TIME = 0.5
+UNANSWERED_DELAY = 0.1      # Requests without a reply to learn from, like mute all
+POWER_ON_DELAY = 0.05       # Give Nuvo zone time to power up
+ALL_OFF_DELAY = 1.1         # Nuvo does NOT process commands immediately after ALLOFF
+SMOOTHING = 0.25            # Weight of a new sample in the running averages
+MIN_WINDOW = 1
+INITIAL_WINDOW = 2
+MAX_WINDOW = 4
+WINDOW_STEP = 8             # Replies in a row before one more request may be in flight
+MAX_BACKOFF = 8
+
+
+class CommandTiming(object):
+    """What the pacer has learned about one command type."""
+
+    def __init__(self, byte_time):
+        self.process = INITIAL_PROCESS_TIME
+        self.reply_time = INITIAL_REPLY_BYTES * byte_time
+        self.samples = 0
+
+    def add(self, process, reply_time):
+        self.process += SMOOTHING * (min(process, MAX_PROCESS_TIME) - self.process)
+        self.reply_time += SMOOTHING * (reply_time - self.reply_time)
+        self.samples += 1
+
+
+class NuvoPacer(object):
+    """Decides when the next request may be written.
+
+    Times are in seconds on the event loop clock.
+    """
+
+    def __init__(self, baud):
+        self.byte_time = BITS_PER_BYTE / baud
+        self.window = INITIAL_WINDOW
+        self.backoff = 1.0
+        self.timings = {}
+        self._answered = 0
+        self._next_received_at = 0.0
+        self._zone_ready_at = {}
+        self._line_free_at = 0.0
+
+    def _timing(self, kind):
+        timing = self.timings.get(kind)
+        if timing is None:
+            timing = self.timings[kind] = CommandTiming(self.byte_time)
+        return timing
+
+    def _line_time(self, request):
+        # '*' and '\r' around the request
+        return (len(request) + 2) * self.byte_time
+
+    def delay(self, request, expects_reply, inflight, now):
+        """Seconds until the request may be written.
+
+        None means the window is full, wait for a reply or a timeout.
+        """
+        if expects_reply and inflight >= self.window:
+            return None
+        # The amp reads a request while it is still busy with the one before
+        ready_at = max(self._next_received_at - self._line_time(request),
+                       self._zone_ready_at.get(request_zone(request), 0.0))
+        return max(0.0, ready_at - now)
+
+    def written(self, request, expects_reply, now):
+        """Note that a request was written, return when the amp has all of it."""
+        received_at = now + self._line_time(request)
+        kind = command_type(request)
+        if kind == 'ALLOFF':
+            gap = ALL_OFF_DELAY
+        elif not expects_reply:
+            gap = UNANSWERED_DELAY
+        else:
+            timing = self._timing(kind)
+            gap = max(timing.process, timing.reply_time) * self.backoff
+        self._next_received_at = received_at + gap
+        if kind == 'ON':
+            self._zone_ready_at[request_zone(request)] = received_at + POWER_ON_DELAY
+        return received_at
+
+    def answered(self, request, received_at, reply_length, now):
+        """Learn from a reply that has just been read completely.
+
+        The amp starts on a request once it has all of it and the reply
+        to the one before has gone out.
+        """
+        reply_time = reply_length * self.byte_time
+        started_at = max(received_at, self._line_free_at)
+        self._line_free_at = now
+        self._timing(command_type(request)).add(
+            max(0.0, now - reply_time - started_at), reply_time)
+        if self.backoff > 1:
+            self.backoff = max(1.0, self.backoff * 0.75)
+        self._answered += 1
+        if self._answered >= WINDOW_STEP:
+            self._answered = 0
+            self.window = min(MAX_WINDOW, self.window + 1)
+
+    def failed(self):
+        """Back off after a timeout, a busy reply or a garbled line."""
+        self.window = max(MIN_WINDOW, self.window // 2)
+        self.backoff = min(MAX_BACKOFF, self.backoff * 2)
+        self._answered = 0
+
+    def as_dict(self):
+        return {
+            'window': self.window,
+            'backoff': round(self.backoff, 2),
+            'process_ms': {kind: round(timing.process * 1000, 1)
+                           for kind, timing in sorted(self.timings.items()) if timing.samples},
+        }
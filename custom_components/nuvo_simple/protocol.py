@@ -0,0 +1,425 @@
+"""Nuvo Concerto, Essentia D and Simplese serial protocol.
+
+Commands are sent as ``*<request>\\r`` and the amp answers, and reports
+keypad changes, with ``#<response>\\r`` lines.  Nothing in here does any
+I/O so it can be shared by the connection, the emulator and the bridge.
+"""
+import re
+
+EOL = b'\r'
+
+MODEL_CONCERTO = 'CONCERTO'
+MODEL_ESSENTIA_D = 'ESSENTIA_D'
+MODEL_SIMPLESE = 'SIMPLESE'
+MODEL_UNKNOWN = 'Unknown'
+
+VOLUME_MIN = -78
+VOLUME_MAX = 0
+
+'''
+#ZxxPWRppp,SRCs,GRPt,VOL-yy
+'''
+CONSR_PATTERN = re.compile('Z(?P<zone>\\d{2})'
+                     'PWR(?P<power>ON|OFF),'
+                     'SRC(?P<source>\\d),'
+                     'GRP(?P<group>0|1),'
+                     'VOL(?P<volume>-\\d\\d|-MT|-XM)')
+'''
+#ZzzPWRonoff,SRCs,VOLvvv
+'''
+STATUS_PATTERN = re.compile('Z(?P<zone>\\d{2})'
+                     'PWR(?P<power>ON|OFF),'
+                     'SRC(?P<source>\\d),'
+                     'VOL(?P<volume>-\\d\\d|-MT|-XM)')
+'''
+#ZzzPWROFF
+'''
+SIMPLESE_OFF_PATTERN = re.compile('Z(?P<zone>\\d{2})'
+                     'PWR(?P<power>ON|OFF)')
+'''
+#ZxxORp,BASSyy,TREByy,GRPq,VRSTr
+'''
+ESSENTIA_D_SETSR_PATTERN = re.compile('Z(?P<zone>\\d{2})'
+                     'OR(?P<override>\\d),'
+                     'BASS(?P<bass>[+-]?\\d{2}),'
+                     'TREB(?P<treble>[+-]?\\d{2}),'
+                     'GRP(?P<group>0|1),'
+                     'VRST(?P<volume_reset>1|0)')
+'''
+#Z0x,BASSyy,TREByy,GRPq
+'''
+SIMPLESE_SETSR_PATTERN = re.compile('Z(?P<zone>\\d{2})'
+                     '(?P<override>.)'
+                     'BASS(?P<bass>[+-]?\\d{2}),'
+                     'TREB(?P<treble>[+-]?\\d{2}),'
+                     'GRP(?P<group>0|1)')
+'''
+#ZzzBASSequ,TREBequ,BALbal,Gg,MAXVOLmax,INIVOLini
+'''
+CONCERTO_SETSR_PATTERN = re.compile('Z(?P<zone>\\d{2})'
+                     'BASS(?P<bass>[+-]?\\d{2}),'
+                     'TREB(?P<treble>[+-]?\\d{2}),'
+                     'BAL(?P<balance>C|L+\\d|R+\\d),'
+                     'G(?P<group>\\d),'
+                     'MAXVOL(?P<maxvol>-\\d\\d),'
+                     'INIVOL(?P<inivol>-\\d\\d)')
+'''
+#MPU_E6D_vx.yy
+'''
+ESSENTIA_D_VERSION = re.compile('MPU_E6D[A-Za-z\t .]+')
+'''
+#MPU_A4D_vx.yy
+'''
+SIMPLESE_VERSION = re.compile('MPU_A4D[A-Za-z\t .]+')
+'''
+#MPU-I8_FWvx.yy
+'''
+CONCERTO_VERSION = re.compile('MPU-I8_[A-Za-z\t .]+')
+'''
+#NV-I8G FWvx.yy HWvx
+'''
+CONCERTO_VERSION2 = re.compile('NV-I8G[A-Za-z\t .]+')
+'''
+#ALLOFF
+'''
+ALL_OFF_PATTERN = re.compile('ALLOFF')
+'''
+#ZxxLKlll
+'''
+KEYPAD_LOCK_PATTERN = re.compile('Z(?P<zone>\\d{2})'
+                     'LK(?P<lock>ON|OFF)')
+'''
+#?
+'''
+ERROR_PATTERN = re.compile('\\?')
+
+
+class ZoneStatus(object):
+    """Power, source and volume of a zone.
+
+    Fields the amp did not report are None.
+    """
+
+    def __init__(self, zone, power, source=None, volume=None, mute=None):
+        self.zone = zone
+        self.power = power
+        self.source = source
+        self.volume = volume
+        self.mute = mute
+
+
+class ZonesetStatus(object):
+    """Tone and per-zone settings of a zone.
+
+    Fields the model does not have are None.
+    """
+
+    def __init__(self, zone, bass, treble, balance=None, group=None,
+                 volume_reset=None, override=None):
+        self.zone = zone
+        self.bass = bass
+        self.treble = treble
+        self.balance = balance
+        self.group = group
+        self.volume_reset = volume_reset
+        self.override = override
+
+
+class KeypadLock(object):
+    """Keypad lock state of a zone."""
+
+    def __init__(self, zone, lock):
+        self.zone = zone
+        self.lock = lock
+
+
+class AllOff(object):
+    """All Off was pressed on a keypad."""
+
+
+class Version(object):
+    """Model reported in reply to a version request."""
+
+    def __init__(self, model):
+        self.model = model
+
+
+class Error(object):
+    """The amp rejected the last command."""
+
+
+class Busy(object):
+    """The amp was busy and dropped the last command."""
+
+
+# Helpers
+
+def db_to_percent(db):
+    if int(db) > -24:
+        return int((( int(db) + 24) / 24 / 2 +.5) * 100)
+    else:
+        return int((( int(db) + 78) / 54 / 2) * 100)
+
+def percent_to_db(percent):
+    if percent > 50:
+        return int(((percent / 100) * 48) - 48)
+    else:
+        return int(((percent / 100) * 108) - 78)
+
+def db_to_level(db):
+    """Media player volume_level, 0..1, of a volume in dB."""
+    if int(db) > -24:
+        return (int(db) + 24) / 24 / 2 + .5
+    return (int(db) + 78) / 54 / 2
+
+def level_to_db(level):
+    """Volume in dB a media player volume_level, 0..1, is set to."""
+    if level > .5:
+        return int((level * 48) - 48)
+    return int((level * 108) - 78)
+
+# volume_level of every volume from VOLUME_MIN to VOLUME_MAX dB
+VOLUME_LEVELS = tuple(db_to_level(db) for db in range(VOLUME_MIN, VOLUME_MAX + 1))
+
+def _parse_volume(volume):
+    """Return (volume, mute), volume is None when the amp reports mute."""
+    if volume in ('-MT', '-XM'):
+        return None, True
+    return int(volume), False
+
+def _parse_zone_status(match):
+    volume, mute = _parse_volume(match.group('volume'))
+    return ZoneStatus(int(match.group('zone')),
+                      match.group('power') == 'ON',
+                      int(match.group('source')),
+                      volume, mute)
+
+def _parse_balance(balance):
+    if balance[0] == 'L':
+        return -int(balance[-1])
+    if balance[0] == 'R':
+        return int(balance[-1])
+    return 0
+
+def parse_response(string: str, model=None):
+    """
+    :param string: line received from the nuvo, without the EOL
+    :param model: model the line came from, if known
+    :return: parsed message, or None if the line was not recognised
+    """
+    match = re.search(ESSENTIA_D_SETSR_PATTERN, string)
+    if match:
+        # The amp reports group and volume reset inverted
+        return ZonesetStatus(int(match.group('zone')),
+                             int(match.group('bass')),
+                             int(match.group('treble')),
+                             group=match.group('group') != '1',
+                             volume_reset=match.group('volume_reset') != '1',
+                             override=(model == MODEL_ESSENTIA_D
+                                       and match.group('override') == '1'))
+
+    match = re.search(CONSR_PATTERN, string)
+    if match:
+        return _parse_zone_status(match)
+
+    match = re.search(STATUS_PATTERN, string)
+    if match:
+        return _parse_zone_status(match)
+
+    match = re.search(SIMPLESE_SETSR_PATTERN, string)
+    if match:
+        return ZonesetStatus(int(match.group('zone')),
+                             int(match.group('bass')),
+                             int(match.group('treble')),
+                             group=match.group('group') != '1',
+                             volume_reset=False,
+                             override=False)
+
+    match = re.search(CONCERTO_SETSR_PATTERN, string)
+    if match:
+        return ZonesetStatus(int(match.group('zone')),
+                             int(match.group('bass')),
+                             int(match.group('treble')),
+                             balance=_parse_balance(match.group('balance')))
+
+    match = re.search(SIMPLESE_OFF_PATTERN, string)
+    if match:
+        return ZoneStatus(int(match.group('zone')), match.group('power') == 'ON')
+
+    if re.search(ALL_OFF_PATTERN, string):
+        return AllOff()
+
+    match = re.search(KEYPAD_LOCK_PATTERN, string)
+    if match:
+        return KeypadLock(int(match.group('zone')), match.group('lock') == 'ON')
+
+    if re.search(ERROR_PATTERN, string):
+        return Error()
+
+    if re.search(ESSENTIA_D_VERSION, string):
+        return Version(MODEL_ESSENTIA_D)
+
+    if re.search(SIMPLESE_VERSION, string):
+        return Version(MODEL_SIMPLESE)
+
+    if re.search(CONCERTO_VERSION, string) or re.search(CONCERTO_VERSION2, string):
+        return Version(MODEL_CONCERTO)
+
+    if string == '#Busy':
+        return Busy()
+
+    return None
+
+def reply_key(request: str):
+    """
+    :param request: request that is sent to the nuvo
+    :return: key of the message that answers it, see message_key, or None
+             if the amp does not answer the request
+    """
+    if request == 'VER':
+        return ('version',)
+    match = re.match('Z(?P<zone>\\d{2})(?P<command>[A-Z]+)', request)
+    if not match:
+        return None
+    zone = int(match.group('zone'))
+    command = match.group('command')
+    if command.startswith(('SETSR', 'BASS', 'TREB', 'BAL', 'GRP', 'VRST')):
+        return ('zoneset', zone)
+    if command.startswith('LK'):
+        return ('keypad_lock', zone)
+    return ('zone', zone)
+
+def message_key(message):
+    """
+    :param message: message returned by parse_response
+    :return: key matching reply_key of the request it answers, or None
+    """
+    if isinstance(message, ZoneStatus):
+        return ('zone', message.zone)
+    if isinstance(message, ZonesetStatus):
+        return ('zoneset', message.zone)
+    if isinstance(message, KeypadLock):
+        return ('keypad_lock', message.zone)
+    if isinstance(message, Version):
+        return ('version',)
+    return None
+
+def format_version_request():
+    return 'VER'
+
+def format_zone_status_request(zone: int, model) -> str:
+    if model == MODEL_CONCERTO:
+        return 'Z{:0=2}STATUS'.format(zone)
+    else:
+        return 'Z{:0=2}CONSR'.format(zone)
+
+def format_zoneset_status_request(zone: int) -> str:
+    return 'Z{:0=2}SETSR'.format(zone)
+
+def format_set_power(zone: int, power: bool) -> str:
+    if power:
+        return 'Z{:0=2}ON'.format(int(zone))
+    else:
+        return 'Z{:0=2}OFF'.format(int(zone))
+
+def format_set_mute(zone: int, mute: bool) -> str:
+    if mute:
+        return 'Z{:0=2}MTON'.format(int(zone))
+    else:
+        return 'Z{:0=2}MTOFF'.format(int(zone))
+
+def format_set_keypad_lock(zone: int, lock: bool) -> str:
+    if lock:
+        return 'Z{:0=2}LKON'.format(int(zone))
+    else:
+        return 'Z{:0=2}LKOFF'.format(int(zone))
+
+def format_set_group(zone: int, group: bool) -> str:
+    if group:
+        return 'Z{:0=2}GRPON'.format(int(zone))
+    else:
+        return 'Z{:0=2}GRPOFF'.format(int(zone))
+
+def format_set_volume_reset(zone: int, volreset: bool) -> str:
+    if volreset:
+        return 'Z{:0=2}VRSTON'.format(int(zone))
+    else:
+        return 'Z{:0=2}VRSTOFF'.format(int(zone))
+
+def format_set_volume(zone: int, volume: int) -> str:
+    # Negative sign in volume parm produces erronous result
+    volume = max(VOLUME_MIN, min(int(volume), VOLUME_MAX))
+    return 'Z{:0=2}VOL{:0=2}'.format(int(zone), abs(volume))
+
+def format_set_bass(zone: int, bass: float) -> str:
+    if bass >= 0:
+        return 'Z{:0=2}BASS+{:0=2}'.format(int(zone), int(bass))
+    else:
+        return 'Z{:0=2}BASS{:0=3}'.format(int(zone), int(bass))
+
+def format_set_treble(zone: int, treble: float) -> str:
+    if treble >= 0:
+        return 'Z{:0=2}TREB+{:0=2}'.format(int(zone), int(treble))
+    else:
+        return 'Z{:0=2}TREB{:0=3}'.format(int(zone), int(treble))
+
+def format_set_balance(zone: int, balance: float) -> str:
+    if balance > 0:
+        return 'Z{:0=2}BALR{:0=1}'.format(int(zone), int(balance))
+    elif balance < 0:
+        return 'Z{:0=2}BALL{:0=1}'.format(int(zone), abs(int(balance)))
+    else:
+        return 'Z{:0=2}BALC'.format(int(zone))
+
+def format_set_source(zone: int, source: int) -> str:
+    source = int(max(1, min(int(source), 6)))
+    return 'Z{:0=2}SRC{}'.format(int(zone), source)
+
+# Responses, as the amp sends them, for the emulator and the bridge
+
+def _format_volume(volume, mute):
+    if mute or volume is None:
+        return '-MT'
+    return '-{:0=2}'.format(abs(int(volume)))
+
+def format_zone_status(status: ZoneStatus, model, group=False) -> str:
+    """Zone status line, without the leading '#'."""
+    power = 'ON' if status.power else 'OFF'
+    volume = _format_volume(status.volume, status.mute)
+    if model == MODEL_CONCERTO:
+        return 'Z{:0=2}PWR{},SRC{},VOL{}'.format(status.zone, power, status.source, volume)
+    return 'Z{:0=2}PWR{},SRC{},GRP{},VOL{}'.format(
+        status.zone, power, status.source, '0' if group else '1', volume)
+
+def format_zoneset_status(status: ZonesetStatus, model) -> str:
+    """Zoneset status line, without the leading '#'."""
+    if model == MODEL_CONCERTO:
+        if status.balance:
+            balance = '{}{}'.format('R' if status.balance > 0 else 'L', abs(int(status.balance)))
+        else:
+            balance = 'C'
+        return 'Z{:0=2}BASS{:+03},TREB{:+03},BAL{},G0,MAXVOL-00,INIVOL-30'.format(
+            status.zone, int(status.bass), int(status.treble), balance)
+    # The amp reports group and volume reset inverted
+    return 'Z{:0=2}OR{},BASS{:+03},TREB{:+03},GRP{},VRST{}'.format(
+        status.zone, '1' if status.override else '0', int(status.bass), int(status.treble),
+        '0' if status.group else '1', '0' if status.volume_reset else '1')
+
+def format_keypad_lock(zone: int, lock: bool) -> str:
+    return 'Z{:0=2}LK{}'.format(int(zone), 'ON' if lock else 'OFF')
+
+def format_version(model) -> str:
+    if model == MODEL_CONCERTO:
+        return 'NV-I8G FWv2.66 HWv0'
+    if model == MODEL_SIMPLESE:
+        return 'MPU_A4D FWv2.01'
+    return 'MPU_E6D FWv1.23'
+
+def format_mute_all() -> str:
+    return 'ALLMON'
+
+def format_unmute_all() -> str:
+    return 'ALLMOFF'
+
+def format_all_off() -> str:
+    return 'ALLOFF'
@@ -0,0 +1,64 @@
+"""Volume ramps planned as the fewest commands the amp needs.
+
+The amp sets volume in whole dB, and a step of one dB is about the
+smallest change anyone hears, so a ramp never needs more commands than
+the dB it covers.  Ramps follow their curve in dB, which is how loudness
+is heard, rather than in volume_level, which bends at -24 dB.  A step
+is planned for the moment the curve reaches each dB value, and steps
+closer together than ``STEP_INTERVAL`` are folded into the later one,
+so a fast ramp skips dB values instead of queueing commands the link
+would coalesce anyway.
+"""
+from .connection import COALESCE_INTERVAL
+
+STEP_INTERVAL = COALESCE_INTERVAL  # Volume commands to one zone go out at most this often
+
+CURVES = {
+    'linear': lambda progress: progress,
+    'ease_in': lambda progress: progress * progress,
+    'ease_out': lambda progress: 1 - (1 - progress) * (1 - progress),
+    'ease_in_out': lambda progress: progress * progress * (3 - 2 * progress),
+}
+
+
+def _time_of(curve, fraction):
+    """Progress, 0..1, at which a curve has covered fraction of the ramp."""
+    low, high = 0.0, 1.0
+    for _ in range(30):
+        middle = (low + high) / 2
+        if curve(middle) < fraction:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+def plan_ramp(start, target, duration, curve='linear'):
+    """Plan the volume steps of a ramp.
+
+    :param start: volume in dB at the start of the ramp
+    :param target: volume in dB at the end of the ramp
+    :param duration: length of the ramp in seconds
+    :param curve: name of the shape of the ramp, one of CURVES
+    :return: list of (seconds from the start, volume in dB), in order
+    """
+    steps = abs(target - start)
+    if not steps:
+        return []
+    if duration <= 0:
+        return [(0.0, target)]
+    direction = 1 if target > start else -1
+    shape = CURVES[curve]
+    plan = []
+    last_at = 0.0
+    for step in range(1, steps + 1):
+        at = duration * _time_of(shape, step / steps)
+        if at - last_at < STEP_INTERVAL:
+            if step < steps:
+                continue
+            # The target always goes out at the end, the step before folds into it
+            if plan:
+                plan.pop()
+        plan.append((at, start + direction * step))
+        last_at = at
+    return plan
@@ -0,0 +1,162 @@
+"""Link statistics for the Nuvo Classic diagnostics and metrics."""
+import re
+import time
+from collections import deque
+
+# Upper bounds, in seconds, of the round-trip latency histogram buckets
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUEUE_SAMPLES = 120      # Seconds of queue depth history kept
+
+COMMAND_TYPE_PATTERN = re.compile('Z(\\d{2})([A-Z]+)')
+
+
+def command_type(request: str) -> str:
+    """Name a request by its command, without the zone and value.
+
+    'Z03VOL40' is 'VOL', 'Z01BALL3' is 'BAL' and 'ALLOFF' is 'ALLOFF'.
+    """
+    match = COMMAND_TYPE_PATTERN.match(request)
+    if not match:
+        return request
+    command = match.group(2)
+    if command.startswith('BAL'):
+        return 'BAL'
+    return command
+
+
+def request_zone(request: str):
+    """Zone a request is for, or 'all' for requests to the whole amp."""
+    match = COMMAND_TYPE_PATTERN.match(request)
+    if not match:
+        return 'all'
+    return int(match.group(1))
+
+
+class ZoneCounters(object):
+    """Requests sent to one zone and how the amp answered them."""
+
+    def __init__(self):
+        self.sent = 0
+        self.replies = 0
+        self.timeouts = 0
+        self.round_trip_sum = 0.0
+        self.round_trip_max = 0.0
+
+
+class LatencyHistogram(object):
+    """Round-trip latencies of one command type."""
+
+    def __init__(self):
+        # One count per bucket in LATENCY_BUCKETS, plus one for slower replies
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        labels = [f'le_{int(bound * 1000)}ms' for bound in LATENCY_BUCKETS] + ['slower']
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count * 1000, 1) if self.count else None,
+            'max_ms': round(self.max * 1000, 1),
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+class NuvoStats(object):
+    """Counters kept by a connection while statistics are enabled.
+
+    The connection holds None instead of an instance when they are
+    disabled, so all it costs then is one test per event.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency = {}
+        self.timeouts = {}
+        self.retries = 0
+        self.reconnects = 0
+        self.errors = 0
+        self.busy = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.queue_depth_max = 0
+        # (seconds since started, deepest queue in that second)
+        self.queue_depth = deque(maxlen=QUEUE_SAMPLES)
+        # Zone id, or 'all' for keypad All Off -> messages nobody asked for
+        self.unsolicited = {}
+        # Zone id, or 'all' for requests to the whole amp -> ZoneCounters
+        self.zones = {}
+
+    def _zone(self, request):
+        zone = request_zone(request)
+        counters = self.zones.get(zone)
+        if counters is None:
+            counters = self.zones[zone] = ZoneCounters()
+        return counters
+
+    def record_sent(self, request, frame_length):
+        self.bytes_out += frame_length
+        self._zone(request).sent += 1
+
+    def record_latency(self, request, seconds):
+        kind = command_type(request)
+        histogram = self.latency.get(kind)
+        if histogram is None:
+            histogram = self.latency[kind] = LatencyHistogram()
+        histogram.add(seconds)
+        counters = self._zone(request)
+        counters.replies += 1
+        counters.round_trip_sum += seconds
+        if seconds > counters.round_trip_max:
+            counters.round_trip_max = seconds
+
+    def record_timeout(self, request):
+        kind = command_type(request)
+        self.timeouts[kind] = self.timeouts.get(kind, 0) + 1
+        self._zone(request).timeouts += 1
+
+    def record_queue_depth(self, depth):
+        if depth > self.queue_depth_max:
+            self.queue_depth_max = depth
+        second = int(time.monotonic() - self.started)
+        if self.queue_depth and self.queue_depth[-1][0] == second:
+            if depth > self.queue_depth[-1][1]:
+                self.queue_depth[-1] = (second, depth)
+        else:
+            self.queue_depth.append((second, depth))
+
+    def record_unsolicited(self, zone):
+        self.unsolicited[zone] = self.unsolicited.get(zone, 0) + 1
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started
+        minutes = elapsed / 60 or 1
+        return {
+            'collecting_for_s': round(elapsed),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'latency': {kind: histogram.as_dict()
+                        for kind, histogram in sorted(self.latency.items())},
+            'timeouts': dict(sorted(self.timeouts.items())),
+            'retries': self.retries,
+            'reconnects': self.reconnects,
+            'errors': self.errors,
+            'busy': self.busy,
+            'queue_depth_max': self.queue_depth_max,
+            'queue_depth': [list(sample) for sample in self.queue_depth],
+            'unsolicited_per_minute': {
+                str(zone): round(count / minutes, 2)
+                for zone, count in sorted(self.unsolicited.items(), key=lambda item: str(item[0]))
+            },
+        }
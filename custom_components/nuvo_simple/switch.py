@@ -14,7 +14,8 @@ from homeassistant.util import dt as dt_util
 from . import (
     DOMAIN as COMPONENT_DOMAIN,
     MODEL,
-    DATA_NUVO,
+    async_add_zone_entities,
+    legacy_entry_data,
     ZONE_SCHEMA,
     CONF_ZONES,
     CONF_SOURCES,
@@ -26,19 +27,22 @@ DOMAIN = 'switch'
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up Nuvo switch entities from a config entry."""
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    model = hass.data[COMPONENT_DOMAIN][MODEL]
-    entities = []
-    for zone_id, extra in zones.items():
-        _LOGGER.info("Adding switch entities for zone %d - %s", zone_id, extra[CONF_NAME])
+    data = hass.data[COMPONENT_DOMAIN][entry.entry_id]
+    coordinator = data['coordinator']
+    model = data[MODEL]
+
+    def zone_entities(zone_id, zone_name):
+        _LOGGER.info("Adding switch entities for zone %d - %s", zone_id, zone_name)
+        entities = []
         if model != 'CONCERTO':
-            entities.append(NuvoGroup(nuvo, zone_id, extra[CONF_NAME]))
+            entities.append(NuvoGroup(coordinator, zone_id, zone_name))
         if model == 'ESSENTIA_D':
-            entities.append(NuvoVolumeReset(nuvo, zone_id, extra[CONF_NAME]))
+            entities.append(NuvoVolumeReset(coordinator, zone_id, zone_name))
         if model != 'CONCERTO':
-            entities.append(NuvoKeypadLock(nuvo, zone_id, extra[CONF_NAME]))
-    async_add_entities(entities, True)
+            entities.append(NuvoKeypadLock(coordinator, zone_id, zone_name))
+        return entities
+
+    async_add_zone_entities(hass, entry, async_add_entities, zone_entities)
 
 
 async def async_setup_platform(
@@ -46,57 +50,78 @@ async def async_setup_platform(
     config: ConfigType,
     async_add_entities: AddEntitiesCallback,
     discovery_info: None) -> None:
-    nuvo = hass.data[COMPONENT_DOMAIN]['nuvo']
-    zones = hass.data[COMPONENT_DOMAIN][CONF_ZONES]
-    hass.data[DATA_NUVO][DOMAIN] = []
+    data = legacy_entry_data(hass)
+    coordinator = data['coordinator']
+    zones = data[CONF_ZONES]
+    entities = []
 
     for zone_id, extra in zones.items():
         _LOGGER.info("Adding switch entities for zone %d - %s", zone_id, extra[CONF_NAME])
-        if hass.data[DATA_NUVO][MODEL] != 'CONCERTO':
-            hass.data[DATA_NUVO][DOMAIN].append(NuvoGroup(nuvo, zone_id, extra[CONF_NAME]))
-        if hass.data[DATA_NUVO][MODEL] == 'ESSENTIA_D':
-            hass.data[DATA_NUVO][DOMAIN].append(NuvoVolumeReset(nuvo, zone_id, extra[CONF_NAME]))
-        if hass.data[DATA_NUVO][MODEL] != 'CONCERTO':
-            hass.data[DATA_NUVO][DOMAIN].append(NuvoKeypadLock(nuvo, zone_id, extra[CONF_NAME]))
+        if data[MODEL] != 'CONCERTO':
+            entities.append(NuvoGroup(coordinator, zone_id, extra[CONF_NAME]))
+        if data[MODEL] == 'ESSENTIA_D':
+            entities.append(NuvoVolumeReset(coordinator, zone_id, extra[CONF_NAME]))
+        if data[MODEL] != 'CONCERTO':
+            entities.append(NuvoKeypadLock(coordinator, zone_id, extra[CONF_NAME]))
 
-    async_add_entities(hass.data[DATA_NUVO][DOMAIN], True)
+    async_add_entities(entities)
 
 class NuvoGroup(SwitchEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name):
+    def __init__(self, coordinator, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
 
+        self._group = None
+        self._stale = False
+
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
-        self.update()
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('group',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (group) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
+
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        zone = self._coordinator.zones[self._zone_id]
+        self._group = zone.group
+        self._stale = 'group' in zone.stale
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            self._group = None
-            return None
-        else:
-            self._group = state.group
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        if zone_name != self._name:
+            self._name = zone_name
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_source_group"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_source_group"
+
+    @property
+    def extra_state_attributes(self):
+        """Flag a value from the last run the amp has not confirmed yet."""
+        return {'stale': self._stale}
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def is_on(self):
         return self._group
@@ -108,49 +133,68 @@ class NuvoGroup(SwitchEntity):
 
     async def async_turn_on(self):
         """Send the on command."""
-        self._nuvo.set_group(self._zone_id, True)
+        self._coordinator.async_set_group(self._zone_id, True)
 
     async def async_turn_off(self):
         """Send the off command."""
-        self._nuvo.set_group(self._zone_id, False)
+        self._coordinator.async_set_group(self._zone_id, False)
 
 class NuvoVolumeReset(SwitchEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name):
+    def __init__(self, coordinator, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
 
-        self._treble = None
+        self._volume_reset = None
+        self._stale = False
 
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('volume_reset',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (volume reset) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
+
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        zone = self._coordinator.zones[self._zone_id]
+        self._volume_reset = zone.volume_reset
+        self._stale = 'volume_reset' in zone.stale
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            self._volume_reset = None
-            return None
-        else:
-            self._volume_reset = state.volume_reset
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        if zone_name != self._name:
+            self._name = zone_name
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_volume_reset"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_volume_reset"
+
+    @property
+    def extra_state_attributes(self):
+        """Flag a value from the last run the amp has not confirmed yet."""
+        return {'stale': self._stale}
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def is_on(self):
         return self._volume_reset
@@ -162,49 +206,60 @@ class NuvoVolumeReset(SwitchEntity):
 
     async def async_turn_on(self):
         """Send the on command."""
-        self._nuvo.set_volume_reset(self._zone_id, True)
+        self._coordinator.async_set_volume_reset(self._zone_id, True)
 
     async def async_turn_off(self):
         """Send the off command."""
-        self._nuvo.set_volume_reset(self._zone_id, False)
+        self._coordinator.async_set_volume_reset(self._zone_id, False)
 
 class NuvoKeypadLock(SwitchEntity):
     """Representation of a Nuvo amplifier zone settings."""
 
-    def __init__(self, nuvo, zone_id, zone_name):
+    def __init__(self, coordinator, zone_id, zone_name):
         """Initialize new zone."""
-        self._nuvo = nuvo
+        self._coordinator = coordinator
         self._zone_id = zone_id
         self._name = zone_name
 
         self._keypad_lock = None
 
     async def async_added_to_hass(self) -> None:
-        self._nuvo.add_callback(self._update_callback, self._zone_id, self._name, 'settings')
+        self.async_on_remove(self._coordinator.async_add_listener(
+            self._zone_id, self._update_callback, ('keypad_lock',)))
+        self._update_from_coordinator()
 
     @callback
     def _update_callback(self):
         _LOGGER.debug('Zone %s settings (keypad lock) update called', self._zone_id)
-        self.schedule_update_ha_state(True)
+        self._update_from_coordinator()
+        self.async_write_ha_state()
+
+    def _update_from_coordinator(self):
+        """Copy the zone snapshot held by the coordinator."""
+        self._keypad_lock = self._coordinator.zones[self._zone_id].keypad_lock
 
-    def update(self):
-        """Retrieve latest state."""
-        state = self._nuvo.zoneset_status(self._zone_id)
-        if not state:
-            self._keypad_lock = None
-            return None
-        else:
-            self._keypad_lock = state.keypad_lock
+    @callback
+    def async_update_options(self, data):
+        """Pick up a new zone name from the options."""
+        zone_name = data[CONF_ZONES][self._zone_id][CONF_NAME]
+        if zone_name != self._name:
+            self._name = zone_name
+            self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return f"nuvo_simple_zone_{self._zone_id}_keypad_lock"
+        return f"{self._coordinator.unique_id_prefix}_zone_{self._zone_id}_keypad_lock"
 
     @property
     def should_poll(self):
         """Disable polling."""
         return False
 
+    @property
+    def available(self):
+        """Unavailable while the link to the amp is down."""
+        return self._coordinator.available
+
     @property
     def is_on(self):
         return self._keypad_lock
@@ -216,8 +271,8 @@ class NuvoKeypadLock(SwitchEntity):
 
     async def async_turn_on(self):
         """Send the on command."""
-        self._nuvo.set_keypad_lock(self._zone_id, True)
+        self._coordinator.async_set_keypad_lock(self._zone_id, True)
 
     async def async_turn_off(self):
         """Send the off command."""
-        self._nuvo.set_keypad_lock(self._zone_id, False)
+        self._coordinator.async_set_keypad_lock(self._zone_id, False)
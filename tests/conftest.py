@@ -0,0 +1,117 @@
+"""Run the integration against tools/nuvo_emulator.py over a local TCP port.
+
+There is no pytest-asyncio here, each test runs its coroutine with the
+``run`` fixture, on a loop of its own.
+"""
+import asyncio
+import contextlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from custom_components.nuvo_simple.connection import NuvoConnection  # noqa: E402
+from custom_components.nuvo_simple.coordinator import NuvoCoordinator  # noqa: E402
+from custom_components.nuvo_simple.protocol import MODEL_ESSENTIA_D  # noqa: E402
+from nuvo_emulator import DEFAULT_BAUD, NuvoEmulator, async_serve_tcp  # noqa: E402
+
+TEST_TIMEOUT = 30   # Seconds before a hanging test fails
+WAIT_TIMEOUT = 3    # Seconds to wait for the amp to get somewhere
+
+
+class RecordingEmulator(NuvoEmulator):
+    """Emulated amp remembering the requests it acted on.
+
+    Requests in ``busy_once`` are answered busy the first time they
+    arrive, and are not acted on then.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log = []
+        self.busy_once = set()
+
+    def handle(self, request):
+        if request in self.busy_once:
+            self.busy_once.discard(request)
+            return ['Busy']
+        self.log.append(request)
+        return super().handle(request)
+
+
+@contextlib.asynccontextmanager
+async def _amp_link(model=MODEL_ESSENTIA_D, zone_count=6):
+    amp = RecordingEmulator(model, zone_count, seed=1)
+    server = await async_serve_tcp(amp, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    nuvo = NuvoConnection(f'socket://127.0.0.1:{port}', DEFAULT_BAUD)
+    await nuvo.async_open()
+    await nuvo.async_get_model()
+    amp.log.clear()
+    try:
+        yield amp, nuvo
+    finally:
+        await nuvo.async_close()
+        server.close()
+
+
+@contextlib.asynccontextmanager
+async def _amp_coordinator(config_dir, zone_count=3, optimistic=False, prefetch=True):
+    async with _amp_link(zone_count=zone_count) as (amp, nuvo):
+        zone_ids = list(range(1, zone_count + 1))
+        coordinator = NuvoCoordinator(HomeAssistant(config_dir), 'test', nuvo, nuvo.model,
+                                      zone_ids, all_off_recall=False, optimistic=optimistic)
+        for zone_id in [0, *zone_ids]:
+            coordinator.register_media_player(zone_id, f'media_player.zone_{zone_id}')
+        if prefetch:
+            await coordinator.async_prefetch()
+        amp.log.clear()
+        try:
+            yield amp, coordinator
+        finally:
+            coordinator.async_shutdown()
+
+
+async def _until(predicate, timeout=WAIT_TIMEOUT):
+    """Wait until predicate() is true, fail if it is not within timeout."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, 'timed out waiting for the amp'
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine on a new event loop."""
+    def run(coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, TEST_TIMEOUT))
+    return run
+
+
+@pytest.fixture
+def amp_link():
+    """Async context manager giving an emulated amp and a NuvoConnection to it."""
+    return _amp_link
+
+
+@pytest.fixture
+def amp_coordinator(tmp_path):
+    """Async context manager giving an emulated amp and a NuvoCoordinator for it.
+
+    Media players are registered as media_player.zone_<zone id>.
+    """
+    def amp_coordinator(**kwargs):
+        return _amp_coordinator(str(tmp_path), **kwargs)
+    return amp_coordinator
+
+
+@pytest.fixture
+def until():
+    return _until
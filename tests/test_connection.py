@@ -0,0 +1,171 @@
+"""Tests for NuvoConnection against the emulated amp."""
+import asyncio
+
+from custom_components.nuvo_simple.connection import (
+    COALESCE_INTERVAL,
+    HEALTH_CONNECTED,
+    HEALTH_DEGRADED,
+    PRIORITY_READ,
+    PRIORITY_URGENT,
+    PRIORITY_USER,
+)
+
+
+def test_requests_are_answered(run, amp_link):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            assert nuvo.health == HEALTH_CONNECTED
+            replies = await nuvo.async_send_batch(['Z01ON', 'Z01VOL30', 'Z01SETSR'])
+            assert [reply.volume for reply in replies[:2]] == [-50, -30]
+            assert replies[2].bass == 0
+            assert amp.zones[1].power and amp.zones[1].volume == -30
+    run(test())
+
+
+def test_replaced_request_sends_the_newest_value(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            futures = [nuvo.send(f'Z01VOL{volume}', (1, 'volume')) for volume in (40, 41, 42)]
+            assert futures[0] is futures[1] is futures[2]
+            assert await futures[0]
+            await until(lambda: amp.zones[1].volume == -42)
+            assert amp.log == ['Z01VOL42']
+    run(test())
+
+
+def test_single_request_is_not_held_back(run, amp_link):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            loop = asyncio.get_running_loop()
+            await nuvo.send('Z01VOL40', (1, 'volume'))
+            start = loop.time()
+            await nuvo.send('Z01VOL41', (1, 'volume'))
+            assert loop.time() - start < COALESCE_INTERVAL / 2
+    run(test())
+
+
+def test_replacing_request_is_held_back(run, amp_link):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            loop = asyncio.get_running_loop()
+            await nuvo.send('Z01VOL40', (1, 'volume'))
+            start = loop.time()
+            nuvo.send('Z01VOL41', (1, 'volume'))
+            assert await nuvo.send('Z01VOL42', (1, 'volume'))
+            assert loop.time() - start >= COALESCE_INTERVAL * 0.9
+    run(test())
+
+
+def test_replaced_request_moves_to_its_new_priority(run, amp_link):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            nuvo.send('Z02VOL40', (2, 'volume'), PRIORITY_READ)
+            nuvo.send('Z02VOL41', (2, 'volume'), PRIORITY_URGENT)
+            assert [len(queue) for queue in nuvo._queues] == [1, 0, 0]
+            assert nuvo._queues[PRIORITY_URGENT][0].request == 'Z02VOL41'
+    run(test())
+
+
+def test_urgent_requests_go_first(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            nuvo.send('Z01CONSR', priority=PRIORITY_READ)
+            nuvo.send('Z02ON', priority=PRIORITY_USER)
+            nuvo.send('Z03ON', priority=PRIORITY_URGENT)
+            await until(lambda: len(amp.log) == 3)
+            assert amp.log == ['Z03ON', 'Z02ON', 'Z01CONSR']
+    run(test())
+
+
+def test_nothing_goes_between_the_requests_of_a_batch(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            batch = asyncio.ensure_future(
+                nuvo.async_send_batch(['Z01ON', 'Z01SRC2', 'Z01VOL30']))
+            await until(lambda: amp.log)
+            nuvo.send('Z02ON', priority=PRIORITY_URGENT)
+            assert None not in await batch
+            await until(lambda: 'Z02ON' in amp.log)
+            assert amp.log.index('Z02ON') == 3
+    run(test())
+
+
+def test_urgent_requests_go_between_the_reads_of_a_sweep(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            sweep = asyncio.ensure_future(nuvo.async_send_batch(
+                [f'Z0{zone}CONSR' for zone in range(1, 7)], PRIORITY_READ, ordered=False))
+            await until(lambda: amp.log)
+            nuvo.send('Z02ON', priority=PRIORITY_URGENT)
+            assert None not in await sweep
+            assert amp.log.index('Z02ON') < 6
+    run(test())
+
+
+def test_busy_batch_member_is_written_again_within_its_batch(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            amp.busy_once.add('Z01SRC2')
+            batch = asyncio.ensure_future(
+                nuvo.async_send_batch(['Z01ON', 'Z01SRC2', 'Z01VOL30']))
+            await until(lambda: amp.log)
+            nuvo.send('Z02ON', priority=PRIORITY_URGENT)
+            replies = await batch
+            assert None not in replies
+            assert replies[1].source == 2
+            await until(lambda: 'Z02ON' in amp.log)
+            assert amp.log[-1] == 'Z02ON'
+            assert sorted(amp.log[:3]) == ['Z01ON', 'Z01SRC2', 'Z01VOL30']
+    run(test())
+
+
+def test_busy_request_is_dropped_for_a_newer_value(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            amp.busy_once.add('Z01VOL40')
+            await nuvo.send('Z01VOL40', (1, 'volume'))
+            # On its way before the busy reply arrives, the retry is not needed
+            await nuvo.send('Z01VOL41', (1, 'volume'))
+            await until(lambda: amp.zones[1].volume == -41)
+            await asyncio.sleep(0.2)
+            assert amp.log == ['Z01VOL41']
+    run(test())
+
+
+def test_busy_request_is_written_again(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            amp.busy_once.add('Z01VOL40')
+            assert await nuvo.send('Z01VOL40', (1, 'volume'))
+            await until(lambda: amp.zones[1].volume == -40)
+            assert amp.log == ['Z01VOL40']
+    run(test())
+
+
+def test_request_waiting_for_the_pacer_fails_when_the_circuit_opens(run, amp_link):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            # Any reply would close the circuit again
+            amp.drop_rate = 1.0
+            await nuvo.send('Z01VOL40')
+            paced = nuvo.send('Z01VOL41')
+            # The writer is waiting for the pacer before writing it
+            await asyncio.sleep(0)
+            assert nuvo.queue_depth == 0
+            nuvo._set_health(HEALTH_DEGRADED)
+            assert await paced is False
+            assert 'Z01VOL41' not in amp.log
+    run(test())
+
+
+def test_circuit_open_fails_requests_right_away(run, amp_link, until):
+    async def test():
+        async with amp_link() as (amp, nuvo):
+            nuvo._set_health(HEALTH_DEGRADED)
+            assert nuvo.circuit_open
+            assert await nuvo.send('Z01ON') is False
+            assert await nuvo.async_send_batch(['Z01ON', 'Z02ON']) == [None, None]
+            # The probe finds the amp again
+            await until(lambda: nuvo.health == HEALTH_CONNECTED)
+            assert await nuvo.send('Z01ON')
+    run(test())
@@ -0,0 +1,178 @@
+"""Tests for NuvoCoordinator against the emulated amp."""
+import asyncio
+
+from custom_components.nuvo_simple.connection import COALESCE_INTERVAL
+
+
+def test_commanded_value_shows_once_the_amp_confirms_it(run, amp_coordinator, until):
+    async def test():
+        async with amp_coordinator() as (amp, coordinator):
+            coordinator.async_set_volume(1, -40)
+            assert coordinator.zones[1].volume == -50
+            assert coordinator._current(1, 'volume') == -40
+            await until(lambda: coordinator.zones[1].volume == -40)
+            assert amp.zones[1].volume == -40
+            assert not coordinator._pending
+    run(test())
+
+
+def test_optimistic_value_shows_right_away(run, amp_coordinator, until):
+    async def test():
+        async with amp_coordinator(optimistic=True) as (amp, coordinator):
+            coordinator.async_set_volume(1, -40)
+            assert coordinator.zones[1].volume == -40
+            await until(lambda: amp.zones[1].volume == -40)
+    run(test())
+
+
+def test_discarded_command_rolls_back_optimistic_value(run, amp_coordinator, until):
+    async def test():
+        async with amp_coordinator(optimistic=True) as (amp, coordinator):
+            await coordinator.async_set_volume(1, -45)
+            await until(lambda: not coordinator._pending)
+            coordinator.async_set_volume(1, -40)
+            # Replaces the one above, held back behind the -45 dB just sent
+            coordinator.async_set_volume(1, -41)
+            assert coordinator.zones[1].volume == -41
+            assert coordinator._async_discard({(1, 'volume')}) == [(1, 'volume')]
+            assert coordinator.zones[1].volume == -45
+            await asyncio.sleep(COALESCE_INTERVAL * 2)
+            assert amp.zones[1].volume == -45
+    run(test())
+
+
+def test_listeners_only_hear_about_their_fields(run, amp_coordinator, until):
+    async def test():
+        async with amp_coordinator() as (amp, coordinator):
+            calls = {'volume': 0, 'bass': 0, 'any': 0}
+            coordinator.async_add_listener(1, lambda: calls.__setitem__(
+                'volume', calls['volume'] + 1), ('volume', 'mute'))
+            coordinator.async_add_listener(1, lambda: calls.__setitem__(
+                'bass', calls['bass'] + 1), ('bass',))
+            coordinator.async_add_listener(1, lambda: calls.__setitem__(
+                'any', calls['any'] + 1))
+            amp.keypad_volume(1, -30)
+            await until(lambda: coordinator.zones[1].volume == -30)
+            assert calls == {'volume': 1, 'bass': 0, 'any': 1}
+    run(test())
+
+
+async def _group(amp, coordinator):
+    """Zone 1 at -40 dB leading zone 2, both on."""
+    await coordinator.async_apply_state({1: {'power': True, 'volume': -40},
+                                         2: {'power': True}})
+    await coordinator.async_join_players(1, ['media_player.zone_2'])
+    assert coordinator.groups.members(1) == [2]
+    assert amp.zones[2].volume == -40
+
+
+def test_group_member_shows_only_what_the_amp_confirmed(run, amp_coordinator, until):
+    async def test():
+        async with amp_coordinator() as (amp, coordinator):
+            await _group(amp, coordinator)
+            loop = asyncio.get_running_loop()
+            synced = []
+            member_volumes = []
+
+            def leader_changed():
+                # Runs once the report from zone 1 has been applied and synced
+                loop.call_soon(lambda: synced.append(
+                    (coordinator.zones[2].volume, coordinator._current(2, 'volume'))))
+
+            coordinator.async_add_listener(1, leader_changed, ('volume',))
+            coordinator.async_add_listener(
+                2, lambda: member_volumes.append(coordinator.zones[2].volume), ('volume',))
+            amp.keypad_volume(1, -30)
+            await until(lambda: coordinator.zones[2].volume == -30)
+            assert synced[0] == (-40, -30)
+            assert member_volumes == [-30]
+            assert amp.zones[2].volume == -30
+            assert amp.log.count('Z02VOL30') == 1
+    run(test())
+
+
+def test_group_member_follows_optimistically(run, amp_coordinator, until):
+    async def test():
+        async with amp_coordinator(optimistic=True) as (amp, coordinator):
+            await _group(amp, coordinator)
+            amp.keypad_volume(1, -30)
+            await until(lambda: coordinator.zones[1].volume == -30)
+            assert coordinator.zones[2].volume == -30
+            await until(lambda: amp.zones[2].volume == -30)
+    run(test())
+
+
+def test_join_overtakes_queued_member_commands(run, amp_coordinator, until):
+    async def test():
+        async with amp_coordinator() as (amp, coordinator):
+            await coordinator.async_apply_state({1: {'power': True, 'volume': -30},
+                                                 2: {'power': True}})
+            await coordinator.async_set_volume(2, -55)
+            coordinator.async_set_volume(2, -60)
+            # Replaces the one above, held back behind the -55 dB just sent
+            coordinator.async_set_volume(2, -61)
+            await coordinator.async_join_players(1, ['media_player.zone_2'])
+            await asyncio.sleep(COALESCE_INTERVAL * 2)
+            assert 'Z02VOL61' not in amp.log
+            assert amp.zones[2].volume == -30
+            assert coordinator.zones[2].volume == -30
+    run(test())
+
+
+def test_apply_state_sends_only_what_differs(run, amp_coordinator):
+    async def test():
+        async with amp_coordinator() as (amp, coordinator):
+            latency = await coordinator.async_apply_state({
+                1: {'power': True, 'volume': -50, 'source': 3},
+                2: {'power': False, 'volume': -20},
+            })
+            assert latency is not None
+            assert amp.log == ['Z01ON', 'Z01SRC3']
+            assert (coordinator.zones[1].power, coordinator.zones[1].source) == (True, 3)
+    run(test())
+
+
+def test_restore_brings_back_a_snapshot(run, amp_coordinator):
+    async def test():
+        async with amp_coordinator() as (amp, coordinator):
+            await coordinator.async_apply_state({1: {'power': True, 'source': 2,
+                                                     'volume': -35, 'bass': 4}})
+            coordinator.async_snapshot('before')
+            await coordinator.async_apply_state({1: {'source': 3, 'volume': -20, 'bass': -2},
+                                                 2: {'power': True}})
+            amp.log.clear()
+            assert await coordinator.async_restore('before') is not None
+            assert sorted(amp.log) == ['Z01BASS+04', 'Z01SRC2', 'Z01VOL35', 'Z02OFF']
+            zone = amp.zones[1]
+            assert (zone.source, zone.volume, zone.bass) == (2, -35, 4)
+            assert not amp.zones[2].power
+            assert await coordinator.async_restore('missing') is None
+    run(test())
+
+
+def test_page_off_restores_the_zones(run, amp_coordinator):
+    async def test():
+        async with amp_coordinator() as (amp, coordinator):
+            await coordinator.async_apply_state({1: {'power': True, 'source': 2,
+                                                     'volume': -35}})
+            coordinator.setup_paging(6, [1, 2], [50, 50])
+            assert await coordinator.async_page_on() is not None
+            assert all(amp.zones[zone_id].power and amp.zones[zone_id].source == 6
+                       for zone_id in (1, 2))
+            assert await coordinator.async_page_off() is not None
+            zone = amp.zones[1]
+            assert (zone.power, zone.source, zone.volume) == (True, 2, -35)
+            assert not amp.zones[2].power
+    run(test())
+
+
+def test_page_off_leaves_unknown_power_alone(run, amp_coordinator):
+    async def test():
+        async with amp_coordinator(prefetch=False) as (amp, coordinator):
+            assert coordinator.zones[1].power is None
+            coordinator.setup_paging(6, [1], [50])
+            await coordinator.async_page_on()
+            await coordinator.async_page_off()
+            assert 'Z01OFF' not in amp.log
+            assert amp.zones[1].power
+    run(test())
@@ -0,0 +1,128 @@
+"""Tests for parsing and formatting the Nuvo serial protocol."""
+import pytest
+
+from custom_components.nuvo_simple.protocol import (
+    MODEL_CONCERTO,
+    MODEL_ESSENTIA_D,
+    MODEL_SIMPLESE,
+    VOLUME_LEVELS,
+    VOLUME_MAX,
+    VOLUME_MIN,
+    AllOff,
+    Busy,
+    Error,
+    KeypadLock,
+    Version,
+    ZoneStatus,
+    ZonesetStatus,
+    db_to_level,
+    format_set_balance,
+    format_set_bass,
+    format_set_power,
+    format_set_source,
+    format_set_treble,
+    format_set_volume,
+    format_version,
+    format_zone_status,
+    format_zoneset_status,
+    level_to_db,
+    message_key,
+    parse_response,
+    reply_key,
+)
+
+
+def test_parse_essentia_d_zone_status():
+    status = parse_response('#Z02PWRON,SRC3,GRP1,VOL-45')
+    assert isinstance(status, ZoneStatus)
+    assert (status.zone, status.power, status.source, status.volume, status.mute) == \
+        (2, True, 3, -45, False)
+
+
+def test_parse_concerto_zone_status():
+    status = parse_response('#Z11PWROFF,SRC1,VOL-MT', MODEL_CONCERTO)
+    assert (status.zone, status.power, status.source, status.volume, status.mute) == \
+        (11, False, 1, None, True)
+
+
+def test_parse_simplese_zone_off():
+    status = parse_response('#Z04PWROFF', MODEL_SIMPLESE)
+    assert (status.zone, status.power, status.source) == (4, False, None)
+
+
+def test_parse_essentia_d_zoneset_status_is_inverted():
+    status = parse_response('#Z03OR1,BASS-04,TREB+06,GRP0,VRST1', MODEL_ESSENTIA_D)
+    assert isinstance(status, ZonesetStatus)
+    assert (status.bass, status.treble) == (-4, 6)
+    assert status.group is True
+    assert status.volume_reset is False
+    assert status.override is True
+
+
+def test_parse_concerto_zoneset_status():
+    status = parse_response('#Z05BASS+02,TREB-10,BALL3,G0,MAXVOL-00,INIVOL-30')
+    assert (status.zone, status.bass, status.treble, status.balance) == (5, 2, -10, -3)
+
+
+@pytest.mark.parametrize('line, kind', [
+    ('#ALLOFF', AllOff),
+    ('#?', Error),
+    ('#Busy', Busy),
+    ('#Z01LKON', KeypadLock),
+    ('#MPU_E6D FWv1.23', Version),
+    ('#NV-I8G FWv2.66 HWv0', Version),
+])
+def test_parse_other_messages(line, kind):
+    assert isinstance(parse_response(line), kind)
+
+
+def test_parse_unknown_line():
+    assert parse_response('#garbage') is None
+
+
+@pytest.mark.parametrize('model', [MODEL_CONCERTO, MODEL_ESSENTIA_D, MODEL_SIMPLESE])
+def test_version_round_trip(model):
+    assert parse_response('#' + format_version(model)).model == model
+
+
+@pytest.mark.parametrize('model', [MODEL_CONCERTO, MODEL_ESSENTIA_D])
+def test_zone_status_round_trip(model):
+    status = parse_response('#' + format_zone_status(ZoneStatus(7, True, 4, -33, False), model),
+                            model)
+    assert (status.zone, status.power, status.source, status.volume, status.mute) == \
+        (7, True, 4, -33, False)
+
+
+def test_zoneset_status_round_trip():
+    sent = ZonesetStatus(1, -8, 12, group=True, volume_reset=True, override=False)
+    status = parse_response('#' + format_zoneset_status(sent, MODEL_ESSENTIA_D),
+                            MODEL_ESSENTIA_D)
+    assert (status.bass, status.treble, status.group, status.volume_reset) == (-8, 12, True, True)
+
+
+def test_format_requests():
+    assert format_set_power(3, True) == 'Z03ON'
+    assert format_set_power(3, False) == 'Z03OFF'
+    assert format_set_volume(12, -5) == 'Z12VOL05'
+    assert format_set_volume(1, -100) == 'Z01VOL78'
+    assert format_set_volume(1, 10) == 'Z01VOL00'
+    assert format_set_source(2, 9) == 'Z02SRC6'
+    assert format_set_bass(1, 4) == 'Z01BASS+04'
+    assert format_set_bass(1, -4) == 'Z01BASS-04'
+    assert format_set_treble(1, 0) == 'Z01TREB+00'
+    assert format_set_balance(1, -2) == 'Z01BALL2'
+    assert format_set_balance(1, 0) == 'Z01BALC'
+
+
+def test_reply_key_matches_message_key():
+    assert reply_key('Z04VOL30') == message_key(parse_response('#Z04PWRON,SRC1,GRP1,VOL-30'))
+    assert reply_key('Z04BASS+02') == message_key(
+        parse_response('#Z04OR0,BASS+02,TREB+00,GRP1,VRST1'))
+    assert reply_key('VER') == ('version',)
+    assert reply_key('ALLMON') is None
+
+
+def test_volume_levels_round_trip():
+    assert len(VOLUME_LEVELS) == VOLUME_MAX - VOLUME_MIN + 1
+    for db in range(VOLUME_MIN, VOLUME_MAX + 1):
+        assert level_to_db(db_to_level(db)) == db
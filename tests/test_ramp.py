@@ -0,0 +1,41 @@
+"""Tests for planning volume ramps."""
+import pytest
+
+from custom_components.nuvo_simple.ramp import CURVES, STEP_INTERVAL, plan_ramp
+
+
+@pytest.mark.parametrize('curve', sorted(CURVES))
+@pytest.mark.parametrize('start, target, duration', [
+    (-60, -20, 3),
+    (-20, -60, 3),
+    (-40, -20, 1),
+    (-78, 0, 3),
+    (-60, -55, 0.3),
+    (-30, -60, 10),
+])
+def test_plan_ends_at_target_on_time(start, target, duration, curve):
+    plan = plan_ramp(start, target, duration, curve)
+    assert plan[-1] == (pytest.approx(duration), target)
+    times = [at for at, _ in plan]
+    volumes = [volume for _, volume in plan]
+    assert all(later - earlier >= STEP_INTERVAL - 1e-9
+               for earlier, later in zip(times, times[1:]))
+    assert volumes == sorted(volumes, reverse=target < start)
+    assert len(set(volumes)) == len(volumes) <= abs(target - start)
+
+
+def test_last_step_folds_the_one_before():
+    # -39 dB is due at 0.4 s, too close to the target at 0.6 s
+    assert plan_ramp(-40, -37, 0.6) == [(pytest.approx(0.6), -37)]
+
+
+def test_short_ramp_is_one_step():
+    assert plan_ramp(-60, -59, 0.1) == [(pytest.approx(0.1), -59)]
+
+
+def test_nothing_to_ramp():
+    assert plan_ramp(-30, -30, 5) == []
+
+
+def test_no_duration_jumps():
+    assert plan_ramp(-60, -20, 0) == [(0.0, -20)]
@@ -0,0 +1,430 @@
+"""Benchmark the integration against the emulated amp.
+
+Loads the integration into a bare Home Assistant instance, connects it
+to ``nuvo_emulator`` over TCP and drives it the way users do: through
+the paging, mute all and all off services, and through the media player
+volume and source and the bass number entities.  Each call is timed from
+the service call to the state change it causes.
+
+For 1, 6 and 12 zones it reports the p50/p99 latency of every scenario,
+the commands per second the amp received, the longest time the event
+loop was blocked and how long the config entry took to set up.  Needs
+Home Assistant installed, like a development environment does.
+
+    python3 tools/benchmark.py --output tools/benchmarks/v2.0.3.json
+    python3 tools/benchmark.py --compare tools/benchmarks/v2.0.3.json
+
+Results are written as JSON.  ``--compare`` prints the change against an
+earlier result and exits with status 1 if any latency got slower by more
+than ``--threshold`` percent.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPONENT_DIR = os.path.join(TOOLS_DIR, '..', 'custom_components', 'nuvo_simple')
+sys.path.insert(0, TOOLS_DIR)
+
+from homeassistant import config_entries, core, loader  # noqa: E402
+from homeassistant.const import __version__ as HA_VERSION  # noqa: E402
+from homeassistant.helpers import (  # noqa: E402
+    area_registry as ar,
+    device_registry as dr,
+    entity,
+    entity_registry as er,
+)
+
+import nuvo_emulator  # noqa: E402
+
+DOMAIN = 'nuvo_simple'
+ZONE_COUNTS = (1, 6, 12)
+PAGE_SOURCE = 6
+STATE_TIMEOUT = 10       # Seconds to wait for a state change before giving up
+LAG_INTERVAL = 0.005     # Seconds between event loop lag samples
+SETTLE_TIME = 0.3        # Let coalescing and replies drain between scenarios
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def percentile(values, percent):
+    """Nearest rank percentile, None for no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, int(round(percent / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+class LagMonitor(object):
+    """Measure how late the event loop runs a task that sleeps briefly."""
+
+    def __init__(self):
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _async_run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            lag = loop.time() - start - LAG_INTERVAL
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def start(self):
+        self.max_lag = 0.0
+        self._task = asyncio.get_running_loop().create_task(self._async_run())
+
+    async def async_stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return self.max_lag
+
+
+class StateWaiter(object):
+    """Wait until a set of entities all satisfy a predicate."""
+
+    def __init__(self, hass, entity_ids, predicate):
+        self._predicate = predicate
+        self._remaining = {entity_id for entity_id in entity_ids
+                           if not predicate(hass.states.get(entity_id))}
+        self.done_at = time.perf_counter() if not self._remaining else None
+        self._event = asyncio.Event()
+        if not self._remaining:
+            self._event.set()
+            self._unsub = None
+        else:
+            self._unsub = hass.bus.async_listen('state_changed', self._state_changed)
+
+    @core.callback
+    def _state_changed(self, event):
+        entity_id = event.data['entity_id']
+        if entity_id in self._remaining and self._predicate(event.data['new_state']):
+            self._remaining.discard(entity_id)
+            if not self._remaining:
+                self.done_at = time.perf_counter()
+                self._event.set()
+
+    async def async_wait(self):
+        try:
+            await asyncio.wait_for(self._event.wait(), STATE_TIMEOUT)
+        finally:
+            if self._unsub is not None:
+                self._unsub()
+        return self.done_at
+
+
+def _attribute_is(name, value, tolerance=None):
+    def predicate(state):
+        if state is None:
+            return False
+        current = state.attributes.get(name)
+        if tolerance is not None:
+            return current is not None and abs(current - value) <= tolerance
+        return current == value
+    return predicate
+
+
+def _state_is(value):
+    def predicate(state):
+        return state is not None and state.state == value
+    return predicate
+
+
+def _number_is(value):
+    def predicate(state):
+        try:
+            return state is not None and float(state.state) == value
+        except ValueError:
+            return False
+    return predicate
+
+
+class _NoHttp(object):
+    def register_view(self, view):
+        pass
+
+
+async def async_make_hass(config_dir):
+    """Bring up just enough of Home Assistant to set up the integration."""
+    hass = core.HomeAssistant(config_dir)
+    loader.async_setup(hass)
+    hass.config.skip_pip = True
+    # The integration's dependencies are not needed to talk to the amp,
+    # only somewhere for the media player platform to register its view
+    hass.config.components.update({'http', 'zeroconf'})
+    hass.http = _NoHttp()
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    entity.async_setup(hass)
+    await ar.async_load(hass)
+    await dr.async_load(hass)
+    await er.async_load(hass)
+    if hasattr(hass, 'set_state'):
+        hass.set_state(core.CoreState.running)
+    else:
+        hass.state = core.CoreState.running
+    return hass
+
+
+def make_entry(hass, port, zone_count):
+    data = {
+        'port': f'socket://127.0.0.1:{port}',
+        'baud': '9600',
+        'page_source': str(PAGE_SOURCE),
+        'page_volume': '35',
+        'sources': {str(source): {'name': f'Source {source}'} for source in range(1, 7)},
+        'zones': {str(zone): {'name': f'Zone {zone}'} for zone in range(1, zone_count + 1)},
+    }
+    kwargs = {}
+    if 'minor_version' in inspect.signature(config_entries.ConfigEntry).parameters:
+        kwargs['minor_version'] = 1
+    entry = config_entries.ConfigEntry(
+        version=1, domain=DOMAIN, title='Nuvo benchmark', data=data, source='user', **kwargs)
+    hass.config_entries._entries[entry.entry_id] = entry
+    if hasattr(hass.config_entries, '_domain_index'):
+        hass.config_entries._domain_index.setdefault(DOMAIN, []).append(entry)
+    return entry
+
+
+class Benchmark(object):
+    """One integration set up against one emulated amp."""
+
+    def __init__(self, hass, emulator, entry, zone_count):
+        self.hass = hass
+        self.emulator = emulator
+        self.entry = entry
+        self.zone_count = zone_count
+        self.lag_monitor = LagMonitor()
+        registry = er.async_get(hass)
+        prefix = f'{DOMAIN}_{entry.entry_id}_zone_'
+        zones = range(1, zone_count + 1)
+        self.players = [registry.async_get_entity_id('media_player', DOMAIN, f'{prefix}{zone}')
+                        for zone in zones]
+        self.basses = [registry.async_get_entity_id('number', DOMAIN, f'{prefix}{zone}_bass')
+                       for zone in zones]
+
+    @property
+    def nuvo(self):
+        return self.hass.data[DOMAIN][self.entry.entry_id]['nuvo']
+
+    async def async_call(self, domain, service, data, entity_ids, predicate):
+        """Call a service and return the seconds until the state follows."""
+        waiter = StateWaiter(self.hass, entity_ids, predicate)
+        start = time.perf_counter()
+        await self.hass.services.async_call(domain, service, data, blocking=True)
+        done_at = await waiter.async_wait()
+        return done_at - start
+
+    async def async_scenario(self, name, iterations, step):
+        """Run step(i) iterations times and summarize the latencies."""
+        await asyncio.sleep(SETTLE_TIME)
+        requests = self.emulator.requests
+        busy_time = self.nuvo.busy_time
+        latencies = []
+        self.lag_monitor.start()
+        start = time.perf_counter()
+        for i in range(iterations):
+            latencies.extend(await step(i))
+        elapsed = time.perf_counter() - start
+        max_lag = await self.lag_monitor.async_stop()
+        commands = self.emulator.requests - requests
+        result = {
+            'count': len(latencies),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'commands': commands,
+            'commands_per_s': round(commands / elapsed, 1),
+            'loop_blocked_max_ms': round(max_lag * 1000, 2),
+            'busy_ms': round((self.nuvo.busy_time - busy_time) * 1000, 2),
+        }
+        _LOGGER.info('%2d zones %-12s %s', self.zone_count, name, result)
+        return result
+
+    async def async_power_on(self):
+        await self.async_call('media_player', 'turn_on', {'entity_id': self.players},
+                              self.players, _state_is('on'))
+
+    async def async_run(self, iterations):
+        results = {}
+        await self.async_power_on()
+
+        async def volume(i):
+            entity_id = self.players[i % self.zone_count]
+            level = 0.75 if (i // self.zone_count) % 2 == 0 else 0.25
+            return [await self.async_call(
+                'media_player', 'volume_set', {'entity_id': entity_id, 'volume_level': level},
+                [entity_id], _attribute_is('volume_level', level, 0.01))]
+        results['volume_set'] = await self.async_scenario('volume_set', iterations, volume)
+
+        async def source(i):
+            entity_id = self.players[i % self.zone_count]
+            name = f'Source {1 + (i // self.zone_count) % 2 + 1}'
+            return [await self.async_call(
+                'media_player', 'select_source', {'entity_id': entity_id, 'source': name},
+                [entity_id], _attribute_is('source', name))]
+        results['select_source'] = await self.async_scenario('select_source', iterations, source)
+
+        async def bass(i):
+            entity_id = self.basses[i % self.zone_count]
+            value = 4.0 if (i // self.zone_count) % 2 == 0 else -4.0
+            return [await self.async_call(
+                'number', 'set_value', {'entity_id': entity_id, 'value': value},
+                [entity_id], _number_is(value))]
+        results['bass'] = await self.async_scenario('bass', iterations, bass)
+
+        async def paging(i):
+            page_on = await self.async_call(
+                DOMAIN, 'paging_on', {}, self.players,
+                _attribute_is('source', f'Source {PAGE_SOURCE}'))
+            page_off = await self.async_call(
+                DOMAIN, 'paging_off', {}, self.players,
+                lambda state: state is not None
+                and state.attributes.get('source') != f'Source {PAGE_SOURCE}')
+            return [page_on, page_off]
+        results['paging'] = await self.async_scenario('paging', max(1, iterations // 4), paging)
+
+        async def mute_all(i):
+            mute = await self.async_call(DOMAIN, 'mute_all', {}, self.players,
+                                         _attribute_is('is_volume_muted', True))
+            unmute = await self.async_call(DOMAIN, 'unmute_all', {}, self.players,
+                                           _attribute_is('is_volume_muted', False))
+            return [mute, unmute]
+        results['mute_all'] = await self.async_scenario('mute_all', max(1, iterations // 4),
+                                                        mute_all)
+
+        async def all_off(i):
+            latency = await self.async_call(DOMAIN, 'all_off', {}, self.players, _state_is('off'))
+            await self.async_power_on()
+            return [latency]
+        results['all_off'] = await self.async_scenario('all_off', max(1, iterations // 4),
+                                                       all_off)
+        return results
+
+
+async def async_run_zone_count(args, zone_count):
+    emulator = nuvo_emulator.NuvoEmulator(args.model, 12, args.baud, args.jitter,
+                                          args.drop_rate, seed=args.seed)
+    server = await nuvo_emulator.async_serve_tcp(emulator, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    with tempfile.TemporaryDirectory() as config_dir:
+        os.makedirs(os.path.join(config_dir, 'custom_components'))
+        os.symlink(os.path.abspath(COMPONENT_DIR),
+                   os.path.join(config_dir, 'custom_components', DOMAIN))
+        hass = await async_make_hass(config_dir)
+        entry = make_entry(hass, port, zone_count)
+
+        requests = emulator.requests
+        start = time.perf_counter()
+        if not await hass.config_entries.async_setup(entry.entry_id):
+            raise RuntimeError('Integration failed to set up')
+        await hass.async_block_till_done()
+        setup = {
+            'setup_ms': round((time.perf_counter() - start) * 1000, 1),
+            'commands': emulator.requests - requests,
+        }
+        _LOGGER.info('%2d zones %-12s %s', zone_count, 'setup', setup)
+
+        benchmark = Benchmark(hass, emulator, entry, zone_count)
+        results = {'setup': setup, **await benchmark.async_run(args.iterations)}
+
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_stop(force=True)
+    server.close()
+    return results
+
+
+async def async_main(args):
+    results = {}
+    for zone_count in args.zones:
+        results[f'{zone_count}_zones'] = await async_run_zone_count(args, zone_count)
+    with open(os.path.join(COMPONENT_DIR, 'manifest.json')) as manifest:
+        version = json.load(manifest)['version']
+    return {
+        'version': version,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'homeassistant': HA_VERSION,
+        'settings': {
+            'model': args.model,
+            'baud': args.baud,
+            'jitter': args.jitter,
+            'drop_rate': args.drop_rate,
+            'iterations': args.iterations,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, report, threshold):
+    """Print the change in each latency, return True if one regressed."""
+    regressed = False
+    for group, scenarios in report['results'].items():
+        for scenario, result in scenarios.items():
+            old = baseline['results'].get(group, {}).get(scenario)
+            if old is None:
+                continue
+            for metric in ('setup_ms', 'p50_ms', 'p99_ms'):
+                if metric not in result or not old.get(metric):
+                    continue
+                change = (result[metric] - old[metric]) / old[metric] * 100
+                flag = ''
+                if change > threshold:
+                    flag = '  REGRESSION'
+                    regressed = True
+                print(f'{group:>9} {scenario:<14} {metric:<9} {old[metric]:>9.1f} -> '
+                      f'{result[metric]:>9.1f} ms  {change:+6.1f}%{flag}')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--zones', type=int, nargs='+', default=list(ZONE_COUNTS),
+                        help='zone counts to run (default: 1 6 12)')
+    parser.add_argument('--iterations', type=int, default=24,
+                        help='calls per entity scenario, a quarter of that for services')
+    parser.add_argument('--model', choices=(nuvo_emulator.MODEL_ESSENTIA_D,
+                                            nuvo_emulator.MODEL_CONCERTO),
+                        default=nuvo_emulator.MODEL_ESSENTIA_D)
+    parser.add_argument('--baud', type=int, default=nuvo_emulator.DEFAULT_BAUD)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=20,
+                        help='percent slower that counts as a regression (default: 20)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for name in ('homeassistant', 'custom_components', 'nuvo_emulator', 'asyncio'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    report = asyncio.run(async_main(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+            output.write('\n')
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(json.load(baseline), report, args.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""Share one Nuvo amplifier serial port with many TCP clients.
+
+Every client sees the amp as if it were on its own ``socket://`` link:
+
+* Zone status, zone settings and version queries are answered from a
+  cache that the bridge keeps from everything the amp reports, so only
+  queries for state the bridge does not know yet reach the amp.
+* Everything the amp reports is sent to every client, so a change made
+  by one client or at a keypad shows up on all of them.
+* Commands from all clients are written to the serial line one whole
+  line at a time, in the order they arrive.  Error and busy replies go
+  back to the client whose command caused them.
+
+Run it on the machine the amp is connected to, and enter
+``socket://<host>:59001`` as the serial port in the integration setup:
+
+    python3 nuvo_bridge.py /dev/ttyUSB0 --listen 0.0.0.0:59001
+
+It needs ``pyserial-asyncio-fast`` for serial ports, and ``protocol.py``
+from the integration next to it or in the repository it came from.  The
+amp port may also be a ``socket://host:port`` URL, to chain bridges or
+to run against ``nuvo_emulator.py``.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+sys.path.insert(1, os.path.join(TOOLS_DIR, '..', 'custom_components', 'nuvo_simple'))
+
+from protocol import (  # noqa: E402
+    EOL,
+    MODEL_CONCERTO,
+    AllOff,
+    Busy,
+    Error,
+    Version,
+    ZoneStatus,
+    ZonesetStatus,
+    format_version_request,
+    format_zone_status_request,
+    format_zoneset_status_request,
+    message_key,
+    parse_response,
+    reply_key,
+)
+
+_LOGGER = logging.getLogger('nuvo_bridge')
+
+DEFAULT_PORT = 59001
+DEFAULT_BAUD = 9600
+DEFAULT_CACHE_TTL = 300  # Seconds a cached reply is trusted without the amp repeating it
+PRIME_DELAY = 0.1        # Seconds between the queries that fill the cache at startup
+TIMEOUT_RESPONSE = 1     # Seconds before a forwarded command no longer expects a reply
+RECONNECT_DELAY = 5
+
+
+class BridgeClient(object):
+    """One TCP client of the bridge."""
+
+    def __init__(self, bridge, reader, writer):
+        self.bridge = bridge
+        self.reader = reader
+        self.writer = writer
+        self.name = '%s:%s' % writer.get_extra_info('peername')[:2]
+
+    def send(self, line):
+        self.writer.write(line.encode() + b'\r\n')
+
+    async def async_run(self):
+        try:
+            while True:
+                try:
+                    line = await self.reader.readuntil(EOL)
+                except asyncio.LimitOverrunError as err:
+                    await self.reader.readexactly(err.consumed)
+                    continue
+                request = line.decode('ascii', errors='replace').strip()
+                if request.startswith('*'):
+                    self.bridge.handle_request(self, request[1:])
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            self.bridge.clients.remove(self)
+            self.writer.close()
+            _LOGGER.info('Client %s disconnected', self.name)
+
+
+class NuvoBridge(object):
+    """The shared link to the amp and the state cache."""
+
+    def __init__(self, port_url, baud=DEFAULT_BAUD, zone_count=12, cache_ttl=DEFAULT_CACHE_TTL):
+        self.port_url = port_url
+        self.baud = baud
+        self.zone_count = zone_count
+        self.cache_ttl = cache_ttl
+        self.model = None
+        self.clients = []
+        # message_key -> (line as the amp sent it, time received)
+        self._cache = {}
+        # Zones with source grouping on, they follow each other silently
+        self._grouped = set()
+        # (client, reply key, time written) of forwarded commands, oldest first
+        self._inflight = []
+        self._reader = None
+        self._writer = None
+        self._model_event = asyncio.Event()
+        # Requests answered from the cache and passed on to the amp
+        self.cache_hits = 0
+        self.forwarded = 0
+
+    async def _async_open(self):
+        _LOGGER.info('Opening "%s" at %s baud', self.port_url, self.baud)
+        if self.port_url.startswith('socket://'):
+            url = urlparse(self.port_url)
+            self._reader, self._writer = await asyncio.open_connection(url.hostname, url.port)
+        else:
+            import serial_asyncio_fast
+            self._reader, self._writer = await serial_asyncio_fast.open_serial_connection(
+                url=self.port_url, baudrate=self.baud)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._cache.clear()
+
+    async def async_run(self):
+        """Keep the amp link open and read from it."""
+        while True:
+            try:
+                await self._async_open()
+            except OSError as err:
+                _LOGGER.error('Unable to open "%s": %s, retrying', self.port_url, err)
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            prime = asyncio.get_running_loop().create_task(self._async_prime())
+            try:
+                while True:
+                    try:
+                        line = await self._reader.readuntil(EOL)
+                    except asyncio.LimitOverrunError as err:
+                        await self._reader.readexactly(err.consumed)
+                        continue
+                    self._handle_line(line.decode('ascii', errors='replace').strip())
+            except (asyncio.IncompleteReadError, OSError):
+                _LOGGER.error('Lost "%s", reopening', self.port_url)
+            finally:
+                prime.cancel()
+                self._close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _async_prime(self):
+        """Read the version and every zone so clients are answered from the cache."""
+        self._model_event.clear()
+        while not self._model_event.is_set():
+            self._forward(None, format_version_request())
+            try:
+                await asyncio.wait_for(self._model_event.wait(), TIMEOUT_RESPONSE)
+            except asyncio.TimeoutError:
+                pass
+        for zone in range(1, self.zone_count + 1):
+            self._forward(None, format_zone_status_request(zone, self.model))
+            await asyncio.sleep(PRIME_DELAY)
+            self._forward(None, format_zoneset_status_request(zone))
+            await asyncio.sleep(PRIME_DELAY)
+        _LOGGER.info('Cached %d replies', len(self._cache))
+
+    def _forward(self, client, request):
+        """Write a request to the amp for a client, None for the bridge itself."""
+        if self._writer is None:
+            return False
+        self._writer.write(('*' + request + '\r').encode())
+        self._expire_inflight()
+        self._inflight.append((client, reply_key(request), time.monotonic()))
+        return True
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        line, received = entry
+        if self.cache_ttl and time.monotonic() - received > self.cache_ttl:
+            del self._cache[key]
+            return None
+        return line
+
+    def _invalidate_zones(self, zones):
+        for zone in zones:
+            self._cache.pop(('zone', zone), None)
+
+    def handle_request(self, client, request):
+        """Answer a request from the cache or pass it on to the amp."""
+        if request == 'VER' or request.endswith(('CONSR', 'STATUS', 'SETSR')):
+            line = self._cached(reply_key(request))
+            if line is not None:
+                self.cache_hits += 1
+                _LOGGER.debug('%s: "%s" from cache', client.name, request)
+                client.send(line)
+                return
+
+        if request.startswith('ALL'):
+            # Mute all and all off change zones the amp may not report
+            self._invalidate_zones(range(1, self.zone_count + 1))
+        if not self._forward(client, request):
+            client.send('#?')
+            return
+        self.forwarded += 1
+        _LOGGER.debug('%s: "%s" to amp', client.name, request)
+
+    def _expire_inflight(self):
+        now = time.monotonic()
+        while self._inflight and now - self._inflight[0][2] > TIMEOUT_RESPONSE:
+            self._inflight.pop(0)
+
+    def _handle_line(self, line):
+        if not line:
+            return
+        message = parse_response(line, self.model)
+        if isinstance(message, (Error, Busy)):
+            # Only the client whose command failed needs to know
+            self._expire_inflight()
+            if self._inflight:
+                client = self._inflight.pop(0)[0]
+                if client in self.clients:
+                    client.send(line)
+            return
+
+        key = message_key(message) if message is not None else None
+        if key is not None:
+            for index, (_, expected, _) in enumerate(self._inflight):
+                if expected == key:
+                    del self._inflight[index]
+                    break
+            self._update_cache(key, message, line)
+        elif isinstance(message, AllOff):
+            self._invalidate_zones(range(1, self.zone_count + 1))
+
+        for client in self.clients:
+            client.send(line)
+
+    def _update_cache(self, key, message, line):
+        if isinstance(message, Version):
+            self.model = message.model
+            self._model_event.set()
+            _LOGGER.info('Amp is a %s', self.model)
+        elif isinstance(message, ZonesetStatus) and message.group is not None:
+            if message.group:
+                self._grouped.add(message.zone)
+            else:
+                self._grouped.discard(message.zone)
+        elif isinstance(message, ZoneStatus):
+            if message.source is None:
+                # A short power off report does not say everything a query does
+                self._cache.pop(key, None)
+                return
+            if message.zone in self._grouped and self.model != MODEL_CONCERTO:
+                # The amp does not report the zones that follow a source change
+                self._invalidate_zones(self._grouped - {message.zone})
+        self._cache[key] = (line, time.monotonic())
+
+    async def async_serve(self, host, port):
+        async def client_connected(reader, writer):
+            client = BridgeClient(self, reader, writer)
+            self.clients.append(client)
+            _LOGGER.info('Client %s connected, %d in total', client.name, len(self.clients))
+            await client.async_run()
+
+        server = await asyncio.start_server(client_connected, host, port)
+        _LOGGER.info('Listening on %s:%s', host, port)
+        return server
+
+
+async def async_main(args):
+    host, _, port = args.listen.rpartition(':')
+    bridge = NuvoBridge(args.port, args.baud, args.zones, args.cache_ttl)
+    await bridge.async_serve(host or '0.0.0.0', int(port or DEFAULT_PORT))
+    await bridge.async_run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('port', help='serial device of the amp, or socket://host:port')
+    parser.add_argument('--listen', default=f'0.0.0.0:{DEFAULT_PORT}', metavar='[HOST:]PORT',
+                        help=f'address to accept clients on (default: 0.0.0.0:{DEFAULT_PORT})')
+    parser.add_argument('--baud', type=int, default=DEFAULT_BAUD)
+    parser.add_argument('--zones', type=int, default=12,
+                        help='zones to read into the cache at startup (default: 12)')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_CACHE_TTL,
+                        help='seconds to trust a cached reply, 0 for ever '
+                             f'(default: {DEFAULT_CACHE_TTL})')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(async_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+"""Emulate a Nuvo Concerto or Essentia D amplifier for testing.
+
+The emulator answers the same serial protocol as the amp, over a pty
+pair and/or a TCP port that the integration can use as
+``socket://host:port``.  The line runs at the configured baud rate, one
+byte taking ten bit times in each direction, and replies can be given
+jitter or dropped to exercise the integration's timeouts.
+
+    python3 tools/nuvo_emulator.py --model ESSENTIA_D --tcp 59001 --pty
+
+Keypad activity can be simulated with ``--keypad-interval``, which makes
+a random zone change power, source or volume every few seconds and
+reports it the way a real keypad press is reported.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'custom_components', 'nuvo_simple'))
+
+from protocol import (  # noqa: E402
+    EOL,
+    MODEL_CONCERTO,
+    MODEL_ESSENTIA_D,
+    VOLUME_MAX,
+    VOLUME_MIN,
+    ZoneStatus,
+    ZonesetStatus,
+    format_keypad_lock,
+    format_version,
+    format_zone_status,
+    format_zoneset_status,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BAUD = 9600
+BITS_PER_BYTE = 10       # Start bit, 8 data bits, stop bit
+PROCESS_DELAY = 0.005    # Time the amp takes to act on a command
+BUSY_INTERVAL = 0.02     # Commands arriving closer than this may get '#Busy' back
+
+REQUEST_PATTERN = re.compile('Z(?P<zone>\\d{2})(?P<command>[A-Z]+)(?P<value>[+-]?\\w*)')
+
+
+class EmulatedZone(object):
+    """State of one zone of the emulated amp."""
+
+    def __init__(self, zone):
+        self.zone = zone
+        self.power = False
+        self.source = 1
+        self.volume = -50
+        self.mute = False
+        self.bass = 0
+        self.treble = 0
+        self.balance = 0
+        self.group = False
+        self.volume_reset = False
+        self.override = False
+        self.keypad_lock = False
+
+    def status(self):
+        return ZoneStatus(self.zone, self.power, self.source, self.volume, self.mute)
+
+    def zoneset_status(self):
+        return ZonesetStatus(self.zone, self.bass, self.treble, balance=self.balance,
+                             group=self.group, volume_reset=self.volume_reset,
+                             override=self.override)
+
+
+class NuvoEmulator(object):
+    """The amp itself, independent of how it is connected.
+
+    ``handle`` takes one request, without the leading '*', and returns
+    the lines to send back, without the leading '#'.  Everything that
+    changes state outside a request, like keypad presses, is sent to
+    every connected client through ``broadcast``.
+    """
+
+    def __init__(self, model=MODEL_ESSENTIA_D, zone_count=12, baud=DEFAULT_BAUD,
+                 jitter=0.0, drop_rate=0.0, busy_rate=0.0, seed=None):
+        self.model = model
+        self.zones = {zone: EmulatedZone(zone) for zone in range(1, zone_count + 1)}
+        self.byte_time = BITS_PER_BYTE / baud if baud else 0
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.busy_rate = busy_rate
+        self.random = random.Random(seed)
+        self.clients = []
+        # Counters for benchmarks
+        self.requests = 0
+        self.dropped = 0
+
+    def _zone_reply(self, zone):
+        return format_zone_status(zone.status(), self.model, zone.group)
+
+    def _zoneset_reply(self, zone):
+        return format_zoneset_status(zone.zoneset_status(), self.model)
+
+    def _follow_source_group(self, zone):
+        # The amp does not report the other zones of a source group
+        if zone.group and self.model != MODEL_CONCERTO:
+            for other in self.zones.values():
+                if other is not zone and other.group and other.power:
+                    other.source = zone.source
+
+    def handle(self, request):
+        """Act on one request and return the reply lines."""
+        self.requests += 1
+        if request == 'VER':
+            return [format_version(self.model)]
+        if request == 'ALLOFF':
+            replies = []
+            for zone in self.zones.values():
+                if zone.power:
+                    zone.power = False
+                    replies.append(self._zone_reply(zone))
+            return replies
+        if request in ('ALLMON', 'ALLMOFF'):
+            replies = []
+            for zone in self.zones.values():
+                zone.mute = request == 'ALLMON'
+                if zone.power:
+                    replies.append(self._zone_reply(zone))
+            return replies
+
+        match = REQUEST_PATTERN.fullmatch(request)
+        if not match or int(match.group('zone')) not in self.zones:
+            return ['?']
+        zone = self.zones[int(match.group('zone'))]
+        command = match.group('command')
+        value = match.group('value')
+        try:
+            return self._handle_zone(zone, command, value)
+        except ValueError:
+            return ['?']
+
+    def _handle_zone(self, zone, command, value):
+        if command in ('CONSR', 'STATUS') and not value:
+            return [self._zone_reply(zone)]
+        if command == 'SETSR' and not value:
+            return [self._zoneset_reply(zone)]
+        if command == 'ON' and not value:
+            zone.power = True
+            if zone.volume_reset:
+                zone.volume = -50
+            return [self._zone_reply(zone)]
+        if command == 'OFF' and not value:
+            zone.power = False
+            return [self._zone_reply(zone)]
+        if command == 'MTON' and not value:
+            zone.mute = True
+            return [self._zone_reply(zone)]
+        if command == 'MTOFF' and not value:
+            zone.mute = False
+            return [self._zone_reply(zone)]
+        if command == 'VOL':
+            zone.volume = max(VOLUME_MIN, min(-int(value), VOLUME_MAX))
+            zone.mute = False
+            return [self._zone_reply(zone)]
+        if command == 'SRC':
+            zone.source = max(1, min(int(value), 6))
+            self._follow_source_group(zone)
+            return [self._zone_reply(zone)]
+        if command == 'BASS':
+            zone.bass = max(-12, min(int(value), 12))
+            return [self._zoneset_reply(zone)]
+        if command == 'TREB':
+            zone.treble = max(-12, min(int(value), 12))
+            return [self._zoneset_reply(zone)]
+        if command.startswith('BAL') and self.model == MODEL_CONCERTO:
+            side = command[3:] + value
+            if side == 'C':
+                zone.balance = 0
+            elif side[0] in 'LR':
+                zone.balance = int(side[1:]) * (-1 if side[0] == 'L' else 1)
+            else:
+                raise ValueError(side)
+            return [self._zoneset_reply(zone)]
+        if command in ('GRPON', 'GRPOFF') and self.model != MODEL_CONCERTO:
+            zone.group = command == 'GRPON'
+            return [self._zoneset_reply(zone)]
+        if command in ('VRSTON', 'VRSTOFF') and self.model == MODEL_ESSENTIA_D:
+            zone.volume_reset = command == 'VRSTON'
+            return [self._zoneset_reply(zone)]
+        if command in ('LKON', 'LKOFF') and self.model != MODEL_CONCERTO:
+            zone.keypad_lock = command == 'LKON'
+            return [format_keypad_lock(zone.zone, zone.keypad_lock)]
+        return ['?']
+
+    # Keypad activity, reported to every client without a request
+
+    def keypad_power(self, zone_id, power):
+        zone = self.zones[zone_id]
+        zone.power = power
+        self.broadcast([self._zone_reply(zone)])
+
+    def keypad_source(self, zone_id, source):
+        zone = self.zones[zone_id]
+        zone.source = source
+        self._follow_source_group(zone)
+        self.broadcast([self._zone_reply(zone)])
+
+    def keypad_volume(self, zone_id, volume):
+        zone = self.zones[zone_id]
+        zone.volume = max(VOLUME_MIN, min(volume, VOLUME_MAX))
+        zone.mute = False
+        self.broadcast([self._zone_reply(zone)])
+
+    def keypad_all_off(self):
+        for zone in self.zones.values():
+            zone.power = False
+        self.broadcast(['ALLOFF'])
+
+    def set_override(self, zone_id, override):
+        """Flip the keypad DIP switch override of an Essentia D zone."""
+        zone = self.zones[zone_id]
+        zone.override = override
+        self.broadcast([self._zoneset_reply(zone)])
+
+    def broadcast(self, lines):
+        for client in self.clients:
+            client.send(lines)
+
+    async def async_keypad_activity(self, interval):
+        """Press random keypad buttons every interval seconds."""
+        while True:
+            await asyncio.sleep(interval * self.random.uniform(0.5, 1.5))
+            zone_id = self.random.choice(list(self.zones))
+            action = self.random.choice(('power', 'source', 'volume'))
+            if action == 'power':
+                self.keypad_power(zone_id, not self.zones[zone_id].power)
+            elif action == 'source':
+                self.keypad_source(zone_id, self.random.randint(1, 6))
+            else:
+                self.keypad_volume(zone_id, self.random.randint(VOLUME_MIN, -20))
+
+
+class EmulatorLink(object):
+    """One connection to the emulator, with the timing of a serial line.
+
+    ``write`` is called with bytes to send to the client.  Received
+    bytes are fed in with ``data_received``.
+    """
+
+    def __init__(self, emulator, write):
+        self.emulator = emulator
+        self._write = write
+        self._buffer = b''
+        self._rx_free_at = 0.0
+        self._tx_free_at = 0.0
+        self._last_request_at = 0.0
+        self._loop = asyncio.get_running_loop()
+
+    def data_received(self, data):
+        emulator = self.emulator
+        now = time.monotonic()
+        for byte in data:
+            self._rx_free_at = max(self._rx_free_at, now) + emulator.byte_time
+            if byte == EOL[0]:
+                request = self._buffer.decode('ascii', errors='replace').strip()
+                self._buffer = b''
+                if request.startswith('*'):
+                    self._loop.call_later(max(0.0, self._rx_free_at - now) + PROCESS_DELAY,
+                                          self._handle, request[1:])
+            elif byte != ord('\n'):
+                self._buffer += bytes((byte,))
+
+    def _handle(self, request):
+        emulator = self.emulator
+        now = time.monotonic()
+        busy = (now - self._last_request_at < BUSY_INTERVAL
+                and emulator.random.random() < emulator.busy_rate)
+        self._last_request_at = now
+        if busy:
+            self.send(['Busy'])
+            return
+        self.send(emulator.handle(request))
+
+    def send(self, lines):
+        """Send lines at line rate, with jitter, dropping some."""
+        emulator = self.emulator
+        for line in lines:
+            if emulator.drop_rate and emulator.random.random() < emulator.drop_rate:
+                emulator.dropped += 1
+                _LOGGER.debug('Dropping "%s"', line)
+                continue
+            frame = ('#' + line + '\r\n').encode()
+            now = time.monotonic()
+            start = max(self._tx_free_at, now)
+            if emulator.jitter:
+                start += emulator.random.uniform(0, emulator.jitter)
+            self._tx_free_at = start + len(frame) * emulator.byte_time
+            self._loop.call_later(self._tx_free_at - now, self._write, frame)
+
+
+async def async_serve_tcp(emulator, host, port):
+    """Accept TCP clients, each gets its own line to the same amp."""
+
+    async def client_connected(reader, writer):
+        link = EmulatorLink(emulator, writer.write)
+        emulator.clients.append(link)
+        _LOGGER.info('Client connected from %s', writer.get_extra_info('peername'))
+        try:
+            while True:
+                data = await reader.read(256)
+                if not data:
+                    break
+                link.data_received(data)
+        except OSError:
+            pass
+        finally:
+            emulator.clients.remove(link)
+            writer.close()
+
+    server = await asyncio.start_server(client_connected, host, port)
+    _LOGGER.info('Listening on socket://%s:%s', host, server.sockets[0].getsockname()[1])
+    return server
+
+
+def open_pty(emulator):
+    """Open a pty pair and serve the emulator on it, return the device name."""
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    link = EmulatorLink(emulator, lambda data: os.write(master, data))
+    emulator.clients.append(link)
+
+    def read_master():
+        try:
+            data = os.read(master, 256)
+        except OSError:
+            return
+        link.data_received(data)
+
+    asyncio.get_running_loop().add_reader(master, read_master)
+    name = os.ttyname(slave)
+    _LOGGER.info('Serving on %s', name)
+    return name
+
+
+async def async_main(args):
+    emulator = NuvoEmulator(args.model, args.zones, args.baud, args.jitter,
+                            args.drop_rate, args.busy_rate, args.seed)
+    if args.tcp is not None:
+        await async_serve_tcp(emulator, args.host, args.tcp)
+    if args.pty:
+        print(open_pty(emulator), flush=True)
+    if args.keypad_interval:
+        asyncio.get_running_loop().create_task(
+            emulator.async_keypad_activity(args.keypad_interval))
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', choices=(MODEL_ESSENTIA_D, MODEL_CONCERTO),
+                        default=MODEL_ESSENTIA_D)
+    parser.add_argument('--zones', type=int, default=12, help='number of zones (default: 12)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--tcp', type=int, metavar='PORT',
+                        help='serve on a TCP port, for socket://host:port')
+    parser.add_argument('--pty', action='store_true', help='serve on a pty pair')
+    parser.add_argument('--baud', type=int, default=DEFAULT_BAUD,
+                        help='line rate used for the byte delay, 0 for none (default: 9600)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='maximum extra delay added to each reply, in seconds')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='fraction of replies that are lost')
+    parser.add_argument('--busy-rate', type=float, default=0.0,
+                        help='fraction of back-to-back commands answered with #Busy')
+    parser.add_argument('--keypad-interval', type=float, default=0.0,
+                        help='average seconds between simulated keypad presses')
+    parser.add_argument('--seed', type=int, help='random seed, for reproducible runs')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+    if args.tcp is None and not args.pty:
+        parser.error('use --tcp and/or --pty')
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(async_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()